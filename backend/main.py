@@ -1,14 +1,42 @@
 """
 Main FastAPI application entry point.
 """
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-import os
-from dotenv import load_dotenv
-from src.database import create_tables
+import time
 
-# Load environment variables
-load_dotenv()
+# Taken before the other imports so startup timing includes them
+_IMPORTS_STARTED = time.perf_counter()
+
+from dataclasses import asdict  # noqa: E402
+import logging  # noqa: E402
+from fastapi import (  # noqa: E402
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+# Importing the database module loads the .env file
+from src.database import DATABASE_URL, SessionLocal, engine, get_db  # noqa: E402
+from src.repositories import FileRepository, MessageRepository  # noqa: E402
+from src.services import (  # noqa: E402
+    ActivityMiddleware,
+    ArchiveService,
+    ChatError,
+    ChatService,
+    FileStorage,
+    FileTooLargeError,
+    FileValidationError,
+    MaintenanceService,
+    StartupService,
+    WriteScheduler,
+    create_writer_engine,
+)
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Branching Chat API",
@@ -25,10 +53,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+archive_service = ArchiveService(engine)
+maintenance_service = MaintenanceService(engine, archive_service=archive_service)
+file_storage = FileStorage()
+startup_service = StartupService(engine, SessionLocal)
+startup_service.record_phase("imports", time.perf_counter() - _IMPORTS_STARTED)
+
+# Tracks HTTP requests and WebSocket messages so maintenance only runs in
+# idle windows
+app.add_middleware(ActivityMiddleware, get_service=lambda: maintenance_service)
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
-    create_tables()
+    """Prepare the database, start background services and warm the caches."""
+    with startup_service.phase("schema"):
+        startup_service.ensure_schema()
+    with startup_service.phase("connection_pool"):
+        startup_service.prewarm_pool()
+    with startup_service.phase("write_scheduler"):
+        app.state.write_scheduler = WriteScheduler(create_writer_engine(DATABASE_URL))
+        await app.state.write_scheduler.start()
+    maintenance_service.write_scheduler = app.state.write_scheduler
+    app.state.chat_service = ChatService(
+        SessionLocal,
+        app.state.write_scheduler,
+        getattr(app.state, "chat_model", None),
+        archive_service=archive_service,
+        file_storage=file_storage,
+    )
+    with startup_service.phase("cache_warmup"):
+        startup_service.warm_recent_conversations()
+    await maintenance_service.start()
+    startup_service.finish()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending writes and close pooled connections before the worker exits."""
+    await maintenance_service.stop()
+    await app.state.write_scheduler.stop()
+    app.state.write_scheduler.engine.dispose()
 
 @app.get("/")
 async def root():
@@ -40,6 +103,90 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/api/admin/maintenance")
+async def get_maintenance_stats():
+    """Statistics of the last SQLite maintenance run."""
+    if maintenance_service.last_stats is None:
+        raise HTTPException(status_code=404, detail="No maintenance run yet")
+    return asdict(maintenance_service.last_stats)
+
+@app.get("/api/admin/startup")
+async def get_startup_report():
+    """Per-phase timing breakdown of the last startup."""
+    if startup_service.finished is None:
+        raise HTTPException(status_code=404, detail="Startup has not finished")
+    return asdict(startup_service.finished)
+
+# Handlers running synchronous queries are plain functions so FastAPI runs
+# them in its threadpool instead of blocking the event loop.
+@app.get("/api/messages/{message_id}/tree")
+def get_message_tree(
+    message_id: int, depth: int = Query(2, ge=0, le=20), db: Session = Depends(get_db)
+):
+    """Subtree under a message down to `depth` levels, for progressive tree views."""
+    subtree = MessageRepository(db).get_subtree(message_id, depth)
+    if subtree is None and archive_service.restore_message(message_id):
+        subtree = MessageRepository(db).get_subtree(message_id, depth)
+    if subtree is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return subtree.to_dict()
+
+@app.websocket("/ws/chat/{conversation_id}")
+async def chat_websocket(websocket: WebSocket, conversation_id: int):
+    """Stream model replies to chat messages of a conversation."""
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                payload = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Invalid JSON"})
+                continue
+            try:
+                async for event in app.state.chat_service.stream_turn(
+                    conversation_id, payload
+                ):
+                    await websocket.send_json(event)
+            except ChatError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+            except WebSocketDisconnect:
+                raise
+            except Exception:
+                logger.exception("Chat turn failed in conversation %d", conversation_id)
+                await websocket.send_json(
+                    {"type": "error", "detail": "Failed to generate a response"}
+                )
+    except WebSocketDisconnect:
+        pass
+
+@app.post("/api/files", status_code=201)
+async def upload_file(request: Request):
+    """Stream the PDF or image in the multipart `file` field into storage."""
+    try:
+        file_name, stored = await file_storage.save_multipart(
+            request.headers.get("content-type", ""), request.stream()
+        )
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except FileValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"file_name": file_name, **asdict(stored)}
+
+@app.get("/api/files/{file_id}")
+def download_file(
+    file_id: int, request: Request, db: Session = Depends(get_db)
+):
+    """Download the local copy of an attached file, with byte range support."""
+    attached_file = FileRepository(db).get(file_id)
+    if attached_file is None or attached_file.storage_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_storage.file_response(
+        attached_file.storage_path,
+        attached_file.mime_type or "application/octet-stream",
+        attached_file.file_name,
+        request.headers.get("range"),
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
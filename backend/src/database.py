@@ -2,7 +2,7 @@
 Database configuration and session management.
 """
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -19,6 +19,48 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
+
+def data_path(name: str) -> str:
+    """
+    Get a path next to the main SQLite database file.
+
+    Uploads and archive shards live in the same data directory as the
+    database so that one volume holds all of the application's state.
+
+    Args:
+        name: File or directory name inside the data directory
+
+    Returns:
+        Path of ``name`` under the database's directory
+    """
+    db_path = DATABASE_URL.replace("sqlite:///", "")
+    return os.path.join(os.path.dirname(db_path) or ".", name)
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    Apply per-connection SQLite settings.
+
+    WAL lets readers in every worker process run concurrently with the single
+    writer, and the busy timeout makes a writer wait for the lock instead of
+    failing immediately with "database is locked". Incremental auto-vacuum
+    only takes effect on a database created with it, so it is set before the
+    first table exists; the journal size limit truncates the WAL file after
+    checkpoints.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.execute("PRAGMA journal_size_limit=67108864")
+    finally:
+        cursor.close()
+
+
+if "sqlite" in DATABASE_URL:
+    event.listen(engine, "connect", configure_sqlite_connection)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,425 @@
+"""
+WebSocket load test for the chat endpoint, using a fake streaming model.
+
+The FastAPI app is served by uvicorn in a separate process against a
+temporary SQLite database, and many concurrent clients in this process run
+send/stream/fork cycles on ``/ws/chat/{conversation_id}``. Exits with
+status 1 when a latency gate or any turn fails, so it can gate releases.
+
+Usage:
+    python -m src.load_test --clients 200 --cycles 5 --max-stream-end-p99-ms 5000
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Dict, List, Optional
+
+# Seconds to wait for the server process to start up or report back
+SERVER_TIMEOUT = 60.0
+
+
+class FakeStreamingModel:
+    """
+    Model stand-in that streams a fixed number of tokens at a fixed rate.
+
+    Args:
+        tokens_per_second: Streaming rate
+        response_tokens: Tokens per reply
+        first_token_delay: Seconds before the first token
+    """
+
+    def __init__(
+        self,
+        tokens_per_second: float = 50.0,
+        response_tokens: int = 64,
+        first_token_delay: float = 0.2,
+    ):
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.first_token_delay = first_token_delay
+
+    async def stream(self, history: List[Dict[str, str]]):
+        """
+        Stream a reply of ``response_tokens`` tokens.
+
+        Args:
+            history: Conversation history, ignored
+
+        Yields:
+            One token per chunk
+        """
+        await asyncio.sleep(self.first_token_delay)
+        interval = 1 / self.tokens_per_second
+        for index in range(self.response_tokens):
+            if index:
+                await asyncio.sleep(interval)
+            yield f"token{index} "
+
+
+@dataclass
+class LoadTestConfig:
+    """
+    Load test parameters.
+
+    Attributes:
+        clients: Concurrent WebSocket clients, one conversation each
+        cycles: Chat turns per client
+        fork_every: Every Nth turn forks from an earlier reply (0 disables)
+        ramp_up: Seconds over which client start times are spread
+        tokens_per_second: Fake model streaming rate
+        response_tokens: Fake model tokens per reply
+        first_token_delay: Fake model delay before the first token
+    """
+    clients: int = 100
+    cycles: int = 5
+    fork_every: int = 3
+    ramp_up: float = 1.0
+    tokens_per_second: float = 50.0
+    response_tokens: int = 64
+    first_token_delay: float = 0.2
+
+
+@dataclass
+class _Samples:
+    time_to_first_chunk: List[float] = field(default_factory=list)
+    inter_chunk_gap: List[float] = field(default_factory=list)
+    inter_chunk_jitter: List[float] = field(default_factory=list)
+    stream_end: List[float] = field(default_factory=list)
+    db_write: List[float] = field(default_factory=list)
+    event_loop_lag: List[float] = field(default_factory=list)
+    turns: int = 0
+    errors: int = 0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: Samples
+        pct: Percentile between 0 and 100
+
+    Returns:
+        Percentile value, 0.0 for no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _distribution_ms(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round(max(values, default=0.0) * 1000, 2),
+        "count": len(values),
+    }
+
+
+async def _run_client(
+    url: str, config: LoadTestConfig, start_delay: float, samples: _Samples
+) -> None:
+    import websockets
+
+    await asyncio.sleep(start_delay)
+    reply_ids: List[int] = []
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            for cycle in range(config.cycles):
+                payload = {"type": "chat_message", "content": f"Turn {cycle}"}
+                if config.fork_every and cycle and cycle % config.fork_every == 0:
+                    payload["parent_message_id"] = random.choice(reply_ids)
+
+                sent = time.perf_counter()
+                await ws.send(json.dumps(payload))
+                last_chunk: Optional[float] = None
+                gaps: List[float] = []
+                while True:
+                    event = json.loads(await ws.recv())
+                    now = time.perf_counter()
+                    if event["type"] == "stream_chunk":
+                        if last_chunk is None:
+                            samples.time_to_first_chunk.append(now - sent)
+                        else:
+                            gaps.append(now - last_chunk)
+                        last_chunk = now
+                    elif event["type"] == "stream_end":
+                        samples.stream_end.append(now - sent)
+                        reply_ids.append(event["message"]["id"])
+                        samples.turns += 1
+                        break
+                    else:
+                        samples.errors += 1
+                        break
+                samples.inter_chunk_gap.extend(gaps)
+                if len(gaps) > 1:
+                    samples.inter_chunk_jitter.append(statistics.pstdev(gaps))
+    except Exception as e:
+        samples.errors += 1
+        print(f"Client failed: {e!r}", file=sys.stderr)
+
+
+async def _monitor_event_loop_lag(
+    samples: _Samples, stop: asyncio.Event, interval: float = 0.01
+) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.event_loop_lag.append(max(time.perf_counter() - expected, 0.0))
+
+
+def _serve(
+    config: LoadTestConfig, database_path: str, conn: Connection
+) -> None:
+    """
+    Entry point of the server process.
+
+    Args:
+        config: Load test parameters
+        database_path: SQLite file used by the app under test
+        conn: Pipe end for the ready, stop and results messages
+    """
+    # The app's database is configured from DATABASE_URL when src.database is
+    # first imported, which in a spawned process has not happened yet.
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    try:
+        asyncio.run(_serve_app(config, conn))
+    except Exception as e:
+        conn.send({"error": repr(e)})
+        raise
+    finally:
+        conn.close()
+
+
+async def _serve_app(config: LoadTestConfig, conn: Connection) -> None:
+    import uvicorn
+
+    import main
+    from src.repositories.conversation_repository import ConversationRepository
+
+    main.app.state.chat_model = FakeStreamingModel(
+        config.tokens_per_second, config.response_tokens, config.first_token_delay
+    )
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    port = listener.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, log_level="warning"))
+    serving = asyncio.create_task(server.serve(sockets=[listener]))
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+
+    samples = _Samples()
+    scheduler = main.app.state.write_scheduler
+    submit = scheduler.submit
+
+    async def timed_submit(operation):
+        started = time.perf_counter()
+        try:
+            return await submit(operation)
+        finally:
+            samples.db_write.append(time.perf_counter() - started)
+
+    try:
+        conversation_ids = [
+            await scheduler.create(ConversationRepository, {"title": f"Load {i}"})
+            for i in range(config.clients)
+        ]
+        scheduler.submit = timed_submit
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(_monitor_event_loop_lag(samples, stop))
+        conn.send({"port": port, "conversation_ids": conversation_ids})
+        await asyncio.to_thread(conn.recv)
+        stop.set()
+        await monitor
+    finally:
+        scheduler.submit = submit
+        server.should_exit = True
+        await serving
+    conn.send({
+        "db_write": samples.db_write,
+        "event_loop_lag": samples.event_loop_lag,
+    })
+
+
+def _receive(
+    conn: Connection, process: BaseProcess, timeout: float = SERVER_TIMEOUT
+) -> Dict:
+    deadline = time.monotonic() + timeout
+    while not conn.poll(0.1):
+        if not process.is_alive():
+            raise RuntimeError(
+                f"Load test server exited with status {process.exitcode}"
+            )
+        if time.monotonic() > deadline:
+            raise RuntimeError("Load test server did not respond")
+    try:
+        message = conn.recv()
+    except EOFError:
+        raise RuntimeError("Load test server closed its pipe")
+    if "error" in message:
+        raise RuntimeError(f"Load test server failed: {message['error']}")
+    return message
+
+
+async def run_load_test(config: LoadTestConfig, database_path: str) -> Dict:
+    """
+    Serve the app from a separate process and run the configured load on it.
+
+    The clients run in this process, so their JSON decoding and timing do
+    not compete with the server for its event loop. Event-loop lag and DB
+    write latency are measured inside the server process.
+
+    Args:
+        config: Load test parameters
+        database_path: SQLite file used by the app under test
+
+    Returns:
+        Report with latency distributions in milliseconds
+    """
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe()
+    process = context.Process(
+        target=_serve, args=(config, database_path, child_conn), daemon=True
+    )
+    process.start()
+    child_conn.close()
+
+    samples = _Samples()
+    try:
+        ready = await asyncio.to_thread(_receive, conn, process)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _run_client(
+                f"ws://127.0.0.1:{ready['port']}/ws/chat/{conversation_id}",
+                config,
+                config.ramp_up * index / max(config.clients, 1),
+                samples,
+            )
+            for index, conversation_id in enumerate(ready["conversation_ids"])
+        ))
+        duration = time.perf_counter() - started
+        conn.send("stop")
+        server_samples = await asyncio.to_thread(_receive, conn, process)
+        samples.db_write = server_samples["db_write"]
+        samples.event_loop_lag = server_samples["event_loop_lag"]
+        await asyncio.to_thread(process.join, SERVER_TIMEOUT)
+    finally:
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        conn.close()
+
+    return {
+        "clients": config.clients,
+        "turns": samples.turns,
+        "errors": samples.errors,
+        "duration_s": round(duration, 2),
+        "time_to_first_chunk_ms": _distribution_ms(samples.time_to_first_chunk),
+        "inter_chunk_gap_ms": _distribution_ms(samples.inter_chunk_gap),
+        "inter_chunk_jitter_ms": _distribution_ms(samples.inter_chunk_jitter),
+        "stream_end_ms": _distribution_ms(samples.stream_end),
+        "db_write_ms": _distribution_ms(samples.db_write),
+        "event_loop_lag_ms": _distribution_ms(samples.event_loop_lag),
+    }
+
+
+def check_gates(report: Dict, args: argparse.Namespace) -> List[str]:
+    """
+    Compare a report against the release gates given on the command line.
+
+    Args:
+        report: Report from ``run_load_test``
+        args: Parsed command-line arguments
+
+    Returns:
+        Descriptions of the failed gates
+    """
+    failures = []
+    if report["errors"]:
+        failures.append(f"{report['errors']} turns failed")
+    gates = (
+        ("time_to_first_chunk_ms", args.max_ttfc_p99_ms),
+        ("stream_end_ms", args.max_stream_end_p99_ms),
+        ("db_write_ms", args.max_db_write_p99_ms),
+        ("event_loop_lag_ms", args.max_loop_lag_p99_ms),
+    )
+    for metric, limit in gates:
+        if limit is not None and report[metric]["p99"] > limit:
+            failures.append(f"{metric} p99 {report[metric]['p99']} > {limit}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command-line entry point.
+
+    Args:
+        argv: Arguments, defaults to ``sys.argv``
+
+    Returns:
+        Process exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    defaults = LoadTestConfig()
+    parser.add_argument("--clients", type=int, default=defaults.clients)
+    parser.add_argument("--cycles", type=int, default=defaults.cycles)
+    parser.add_argument("--fork-every", type=int, default=defaults.fork_every)
+    parser.add_argument("--ramp-up", type=float, default=defaults.ramp_up)
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=defaults.tokens_per_second
+    )
+    parser.add_argument(
+        "--response-tokens", type=int, default=defaults.response_tokens
+    )
+    parser.add_argument(
+        "--first-token-delay", type=float, default=defaults.first_token_delay
+    )
+    parser.add_argument("--max-ttfc-p99-ms", type=float)
+    parser.add_argument("--max-stream-end-p99-ms", type=float)
+    parser.add_argument("--max-db-write-p99-ms", type=float)
+    parser.add_argument("--max-loop-lag-p99-ms", type=float)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    config = LoadTestConfig(
+        clients=args.clients,
+        cycles=args.cycles,
+        fork_every=args.fork_every,
+        ramp_up=args.ramp_up,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        first_token_delay=args.first_token_delay,
+    )
+    with tempfile.TemporaryDirectory() as data_dir:
+        report = asyncio.run(
+            run_load_test(config, os.path.join(data_dir, "load_test.sqlite"))
+        )
+
+    failures = check_gates(report, args)
+    report["failed_gates"] = failures
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for metric, value in report.items():
+            print(f"{metric}: {value}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,15 +16,25 @@ class AttachedFile(Base):
         message_id: Foreign key to message
         file_name: Original file name
         gemini_file_uri: URI from Google File API
+        storage_path: Path of the local copy, relative to the upload directory
+        content_hash: SHA-256 hex digest of the content
+        mime_type: MIME type detected from the content
+        size_bytes: File size
         created_at: Creation timestamp
         message: Related message
     """
     __tablename__ = "attached_files"
+    # Keep IDs of archived attachments from being reused before a restore
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
     file_name = Column(String, nullable=False)
     gemini_file_uri = Column(String, nullable=False)
+    storage_path = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)
+    mime_type = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     # Relationship
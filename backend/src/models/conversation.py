@@ -6,6 +6,9 @@ from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.orm import relationship
 from ..database import Base
 
+# Characters of the newest message kept for the conversation list
+PREVIEW_LENGTH = 120
+
 
 class Conversation(Base):
     """
@@ -16,6 +19,12 @@ class Conversation(Base):
         title: Conversation title
         created_at: Creation timestamp
         updated_at: Last update timestamp
+        archive_shard: Shard file holding the messages of an archived conversation
+        archived_at: Archival timestamp
+        message_count: Number of messages, maintained on message insert/delete
+        leaf_count: Number of branch tips (messages without children)
+        last_message_at: Creation timestamp of the newest message
+        last_message_preview: Leading text of the newest message
         messages: Related messages
     """
     __tablename__ = "conversations"
@@ -23,10 +32,21 @@ class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), index=True)
+    archive_shard = Column(String, nullable=True)
+    archived_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    leaf_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String, nullable=True)
 
     # Relationship to messages
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
 
+    @property
+    def is_archived(self) -> bool:
+        """Whether the messages of this conversation live in an archive shard."""
+        return self.archive_shard is not None
+
     def __repr__(self):
         return f"<Conversation(id={self.id}, title='{self.title}')>"
\ No newline at end of file
@@ -2,9 +2,13 @@
 Message model for storing chat messages with branching support.
 """
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint
+from typing import Optional
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint, Index, bindparam, event, func, inspect, select, update
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.attributes import NO_VALUE, get_history
 from ..database import Base
+from .conversation import Conversation, PREVIEW_LENGTH
+from ..tokenizer import count_tokens
 
 
 class Message(Base):
@@ -18,6 +22,9 @@ class Message(Base):
         role: Message role ('user' or 'model')
         content: Message content
         node_summary: Summary for tree view display
+        token_count: Tokens in content, counted on insert
+        summary_token_count: Tokens in node_summary
+        path_token_count: Tokens in content from the root through this message
         created_at: Creation timestamp
         conversation: Related conversation
         parent_message: Parent message (for branching)
@@ -28,15 +35,22 @@ class Message(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
-    parent_message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    parent_message_id = Column(Integer, ForeignKey("messages.id"), nullable=True, index=True)
     role = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     node_summary = Column(Text, nullable=True)
+    token_count = Column(Integer, nullable=False, default=0)
+    summary_token_count = Column(Integer, nullable=True)
+    path_token_count = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
-    # Add constraint for role values
+    # Add constraint for role values. AUTOINCREMENT keeps the IDs of archived
+    # messages from being reused before they are restored. The composite
+    # index serves the newest-message lookup behind the conversation stats.
     __table_args__ = (
         CheckConstraint("role IN ('user', 'model')", name="check_role"),
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+        {"sqlite_autoincrement": True},
     )
 
     # Relationships
@@ -46,4 +60,221 @@ class Message(Base):
     attached_files = relationship("AttachedFile", back_populates="message", cascade="all, delete-orphan")
 
     def __repr__(self):
-        return f"<Message(id={self.id}, role='{self.role}', content='{self.content[:50]}...')>"
\ No newline at end of file
+        return f"<Message(id={self.id}, role='{self.role}', content='{self.content[:50]}...')>"
+
+
+@event.listens_for(Message, "before_insert")
+def _count_tokens_on_insert(mapper, connection, target):
+    """
+    Cache token counts so context budgeting never re-tokenizes history.
+    """
+    target.token_count = count_tokens(target.content)
+    if target.node_summary is not None:
+        target.summary_token_count = count_tokens(target.node_summary)
+
+    # Use an already loaded parent instead of lazy loading it mid-flush.
+    parent = inspect(target).attrs.parent_message.loaded_value
+    parent_total = 0
+    if parent is not NO_VALUE and parent is not None:
+        parent_total = parent.path_token_count or 0
+    elif target.parent_message_id is not None:
+        parent_total = connection.scalar(
+            select(Message.path_token_count).where(
+                Message.id == target.parent_message_id
+            )
+        ) or 0
+    target.path_token_count = parent_total + target.token_count
+
+
+@event.listens_for(Message, "before_update")
+def _recount_tokens_on_update(mapper, connection, target):
+    """
+    Keep cached token counts valid when a message is edited after insert.
+
+    A new summary is recounted. New content, or a new parent, changes the
+    cumulative count of this message and of every descendant, which are
+    shifted by the same amount in one statement. Descendants already loaded
+    in the session keep their old value until they are refreshed.
+    """
+    if get_history(target, "node_summary").has_changes():
+        target.summary_token_count = (
+            count_tokens(target.node_summary)
+            if target.node_summary is not None
+            else None
+        )
+
+    content_changed = get_history(target, "content").has_changes()
+    parent_changed = get_history(target, "parent_message_id").has_changes()
+    if not content_changed and not parent_changed:
+        return
+
+    old_path_total = target.path_token_count or 0
+    parent_total = old_path_total - (target.token_count or 0)
+    if content_changed:
+        target.token_count = count_tokens(target.content)
+    if parent_changed:
+        parent_total = 0
+        if target.parent_message_id is not None:
+            parent_total = connection.scalar(
+                select(Message.path_token_count).where(
+                    Message.id == target.parent_message_id
+                )
+            ) or 0
+    target.path_token_count = parent_total + target.token_count
+
+    delta = target.path_token_count - old_path_total
+    if delta:
+        messages = Message.__table__
+        descendants = (
+            select(messages.c.id)
+            .where(messages.c.parent_message_id == target.id)
+            .cte("descendants", recursive=True)
+        )
+        descendants = descendants.union_all(
+            select(messages.c.id).where(
+                messages.c.parent_message_id == descendants.c.id
+            )
+        )
+        connection.execute(
+            update(messages)
+            .where(messages.c.id.in_(select(descendants.c.id)))
+            .values(path_token_count=messages.c.path_token_count + delta)
+        )
+
+
+def backfill_token_counts(connection) -> int:
+    """
+    Recount the cached token counts of every message.
+
+    Rows written before the counts existed hold the column default, which
+    makes every old branch look like it fits the context budget. Each
+    message is tokenized once, then the cumulative counts are rebuilt from
+    the roots down in one statement.
+
+    Args:
+        connection: Connection inside the transaction doing the upgrade
+
+    Returns:
+        Number of messages recounted
+    """
+    messages = Message.__table__
+    rows = connection.execute(
+        select(messages.c.id, messages.c.content, messages.c.node_summary)
+    ).all()
+    if rows:
+        connection.execute(
+            update(messages)
+            .where(messages.c.id == bindparam("message_id"))
+            .values(
+                token_count=bindparam("tokens"),
+                summary_token_count=bindparam("summary_tokens"),
+            ),
+            [
+                {
+                    "message_id": row.id,
+                    "tokens": count_tokens(row.content),
+                    "summary_tokens": (
+                        count_tokens(row.node_summary)
+                        if row.node_summary is not None
+                        else None
+                    ),
+                }
+                for row in rows
+            ],
+        )
+
+    paths = (
+        select(messages.c.id, messages.c.token_count.label("total"))
+        .where(messages.c.parent_message_id.is_(None))
+        .cte("paths", recursive=True)
+    )
+    paths = paths.union_all(
+        select(messages.c.id, paths.c.total + messages.c.token_count).where(
+            messages.c.parent_message_id == paths.c.id
+        )
+    )
+    connection.execute(
+        update(messages)
+        .where(messages.c.id == paths.c.id)
+        .values(path_token_count=paths.c.total)
+    )
+    return len(rows)
+
+
+def _count_children(
+    connection, message_id: int, before_id: Optional[int] = None
+) -> int:
+    messages = Message.__table__
+    query = select(func.count()).select_from(messages).where(
+        messages.c.parent_message_id == message_id
+    )
+    if before_id is not None:
+        query = query.where(messages.c.id < before_id)
+    return connection.scalar(query)
+
+
+@event.listens_for(Message, "after_insert")
+def _update_conversation_stats_on_insert(mapper, connection, target):
+    """
+    Keep the conversation's denormalized stats in the inserting transaction.
+    """
+    # A reply to a leaf moves the branch tip; replying to a message that
+    # already has children, or starting a new root, opens a new branch.
+    # Siblings inserted in the same flush are all in the table by now, so
+    # only children with lower IDs, which AUTOINCREMENT makes the earlier
+    # ones, count as existing before this message.
+    opens_branch = (
+        target.parent_message_id is None
+        or _count_children(connection, target.parent_message_id, target.id) > 0
+    )
+    conversations = Conversation.__table__
+    connection.execute(
+        update(conversations)
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            message_count=conversations.c.message_count + 1,
+            leaf_count=conversations.c.leaf_count + int(opens_branch),
+            last_message_at=target.created_at,
+            last_message_preview=target.content[:PREVIEW_LENGTH],
+            updated_at=target.created_at,
+        )
+    )
+
+
+@event.listens_for(Message, "after_delete")
+def _update_conversation_stats_on_delete(mapper, connection, target):
+    """
+    Keep the conversation's denormalized stats in the deleting transaction.
+
+    Cascaded subtree deletes run children first, so each delete removes a
+    leaf and may turn its parent into one.
+    """
+    leaf_delta = 0
+    if _count_children(connection, target.id) == 0:
+        leaf_delta -= 1
+    if (
+        target.parent_message_id is not None
+        and _count_children(connection, target.parent_message_id) == 0
+    ):
+        leaf_delta += 1
+
+    messages = Message.__table__
+    newest = connection.execute(
+        select(messages.c.created_at, messages.c.content)
+        .where(messages.c.conversation_id == target.conversation_id)
+        .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+        .limit(1)
+    ).first()
+    conversations = Conversation.__table__
+    connection.execute(
+        update(conversations)
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            message_count=conversations.c.message_count - 1,
+            leaf_count=conversations.c.leaf_count + leaf_delta,
+            last_message_at=newest.created_at if newest else None,
+            last_message_preview=newest.content[:PREVIEW_LENGTH] if newest else None,
+            # Deleting messages is not activity; keep the list order stable.
+            updated_at=conversations.c.updated_at,
+        )
+    )
@@ -3,12 +3,13 @@ Repository classes for database operations.
 """
 from .base import BaseRepository
 from .conversation_repository import ConversationRepository
-from .message_repository import MessageRepository
+from .message_repository import MessageRepository, MessageTreeNode
 from .file_repository import FileRepository
 
 __all__ = [
     "BaseRepository",
     "ConversationRepository", 
     "MessageRepository",
+    "MessageTreeNode",
     "FileRepository"
 ]
\ No newline at end of file
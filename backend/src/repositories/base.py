@@ -7,6 +7,10 @@ from sqlalchemy.exc import SQLAlchemyError
 
 T = TypeVar('T')
 
+# Session.info key set by the write scheduler when a session carries a batch
+# of writes that must be committed together.
+BATCHED_WRITES_KEY = "batched_writes"
+
 
 class BaseRepository(Generic[T]):
     """
@@ -20,6 +24,25 @@ class BaseRepository(Generic[T]):
     def __init__(self, model: Type[T], db: Session):
         self.model = model
         self.db = db
+
+    def _commit(self) -> None:
+        """
+        Commit the session, or only flush it inside a batched write.
+
+        The write scheduler owns the transaction of a batched session, so a
+        repository must not end it early.
+        """
+        if self.db.info.get(BATCHED_WRITES_KEY):
+            self.db.flush()
+        else:
+            self.db.commit()
+
+    def _rollback(self) -> None:
+        """
+        Roll back the session unless the write scheduler owns the transaction.
+        """
+        if not self.db.info.get(BATCHED_WRITES_KEY):
+            self.db.rollback()
     
     def create(self, obj_in: dict) -> T:
         """
@@ -37,11 +60,11 @@ class BaseRepository(Generic[T]):
         try:
             db_obj = self.model(**obj_in)
             self.db.add(db_obj)
-            self.db.commit()
+            self._commit()
             self.db.refresh(db_obj)
             return db_obj
         except SQLAlchemyError as e:
-            self.db.rollback()
+            self._rollback()
             raise e
     
     def get(self, id: int) -> Optional[T]:
@@ -88,11 +111,11 @@ class BaseRepository(Generic[T]):
             if db_obj:
                 for field, value in obj_in.items():
                     setattr(db_obj, field, value)
-                self.db.commit()
+                self._commit()
                 self.db.refresh(db_obj)
             return db_obj
         except SQLAlchemyError as e:
-            self.db.rollback()
+            self._rollback()
             raise e
     
     def delete(self, id: int) -> bool:
@@ -112,9 +135,9 @@ class BaseRepository(Generic[T]):
             db_obj = self.get(id)
             if db_obj:
                 self.db.delete(db_obj)
-                self.db.commit()
+                self._commit()
                 return True
             return False
         except SQLAlchemyError as e:
-            self.db.rollback()
+            self._rollback()
             raise e
\ No newline at end of file
@@ -2,10 +2,12 @@
 Repository for conversation database operations.
 """
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, exists, func, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
 from .base import BaseRepository
-from ..models.conversation import Conversation
+from ..models.conversation import Conversation, PREVIEW_LENGTH
+from ..models.message import Message
 
 
 class ConversationRepository(BaseRepository[Conversation]):
@@ -32,6 +34,10 @@ class ConversationRepository(BaseRepository[Conversation]):
         """
         Get recent conversations ordered by updated_at.
         
+        Message counts, branch counts and the last message preview are
+        stored on the conversation row, so this is a single scan of the
+        updated_at index.
+        
         Args:
             limit: Maximum number of conversations to return
             
@@ -76,4 +82,93 @@ class ConversationRepository(BaseRepository[Conversation]):
             self.db.query(Conversation)
             .filter(Conversation.id == conversation_id)
             .first()
-        )
\ No newline at end of file
+        )
+    
+    def get_max_id(self) -> Optional[int]:
+        """
+        Get the highest conversation ID.
+        
+        Returns:
+            Highest ID, None if there are no conversations
+        """
+        return self.db.query(func.max(Conversation.id)).scalar()
+    
+    def reconcile_stats(
+        self, start_id: Optional[int] = None, end_id: Optional[int] = None
+    ) -> int:
+        """
+        Recompute the denormalized message stats of conversations.
+        
+        Repairs drift from writes that bypassed the ORM events, such as bulk
+        deletes. Archived conversations are skipped because their messages
+        live in an archive shard. Each call commits its own transaction, so
+        callers can bound the time the write lock is held by reconciling an
+        ID range at a time.
+        
+        Args:
+            start_id: Lowest conversation ID to check, inclusive
+            end_id: Highest conversation ID to check, exclusive
+        
+        Returns:
+            Number of conversations whose stats were corrected
+        """
+        in_conversation = Message.conversation_id == Conversation.id
+        child = aliased(Message)
+        newest = aliased(Message)
+        message_count = (
+            select(func.count(Message.id)).where(in_conversation).scalar_subquery()
+        )
+        leaf_count = (
+            select(func.count(Message.id))
+            .where(in_conversation)
+            .where(~exists().where(child.parent_message_id == Message.id))
+            .scalar_subquery()
+        )
+        newest_id = (
+            select(newest.id)
+            .where(newest.conversation_id == Conversation.id)
+            .order_by(desc(newest.created_at), desc(newest.id))
+            .limit(1)
+            .correlate(Conversation)
+            .scalar_subquery()
+        )
+        last_message_at = (
+            select(Message.created_at).where(Message.id == newest_id).scalar_subquery()
+        )
+        last_message_preview = (
+            select(func.substr(Message.content, 1, PREVIEW_LENGTH))
+            .where(Message.id == newest_id)
+            .scalar_subquery()
+        )
+        
+        statement = update(Conversation).where(Conversation.archive_shard.is_(None))
+        if start_id is not None:
+            statement = statement.where(Conversation.id >= start_id)
+        if end_id is not None:
+            statement = statement.where(Conversation.id < end_id)
+        
+        try:
+            result = self.db.execute(
+                statement
+                .where(or_(
+                    Conversation.message_count != message_count,
+                    Conversation.leaf_count != leaf_count,
+                    Conversation.last_message_at.is_distinct_from(last_message_at),
+                    Conversation.last_message_preview.is_distinct_from(
+                        last_message_preview
+                    ),
+                ))
+                .values(
+                    message_count=message_count,
+                    leaf_count=leaf_count,
+                    last_message_at=last_message_at,
+                    last_message_preview=last_message_preview,
+                    updated_at=Conversation.updated_at,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self._commit()
+        except SQLAlchemyError as e:
+            self._rollback()
+            raise e
+        return result.rowcount
@@ -1,12 +1,51 @@
 """
 Repository for message database operations.
 """
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, desc, func, literal, or_, select
 from .base import BaseRepository
 from ..models.message import Message
 
+# Keeps IN lists below SQLite's bound-parameter limit
+_IN_CLAUSE_BATCH_SIZE = 500
+
+
+@dataclass
+class MessageTreeNode:
+    """
+    Message with the part of its subtree loaded by a depth-limited expansion.
+    
+    Attributes:
+        message: Message at this node
+        child_count: Number of direct children in the database
+        children: Loaded child nodes, empty on the frontier
+        has_more: Whether children exist that were not loaded
+    """
+    message: Message
+    child_count: int = 0
+    children: List["MessageTreeNode"] = field(default_factory=list)
+    has_more: bool = False
+    
+    def to_dict(self) -> dict:
+        """
+        Serialize the node and its loaded children for the tree view.
+        
+        Returns:
+            Nested dictionary of node fields
+        """
+        return {
+            "id": self.message.id,
+            "parent_message_id": self.message.parent_message_id,
+            "role": self.message.role,
+            "node_summary": self.message.node_summary,
+            "created_at": self.message.created_at,
+            "child_count": self.child_count,
+            "has_more": self.has_more,
+            "children": [child.to_dict() for child in self.children],
+        }
+
 
 class MessageRepository(BaseRepository[Message]):
     """
@@ -55,6 +94,23 @@ class MessageRepository(BaseRepository[Message]):
             .all()
         )
     
+    def get_latest(self, conversation_id: int) -> Optional[Message]:
+        """
+        Get the most recently created message of a conversation.
+        
+        Args:
+            conversation_id: Conversation ID
+            
+        Returns:
+            Latest message if the conversation has any, None otherwise
+        """
+        return (
+            self.db.query(Message)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(desc(Message.created_at), desc(Message.id))
+            .first()
+        )
+    
     def get_children(self, parent_message_id: int) -> List[Message]:
         """
         Get child messages for a parent message.
@@ -72,6 +128,95 @@ class MessageRepository(BaseRepository[Message]):
             .all()
         )
     
+    def get_children_many(
+        self, parent_message_ids: Iterable[int]
+    ) -> Dict[int, List[Message]]:
+        """
+        Get the child messages of several parents in one query.
+        
+        Args:
+            parent_message_ids: Parent message IDs
+            
+        Returns:
+            Child messages ordered by creation time, keyed by parent ID;
+            every requested parent has an entry
+        """
+        parent_ids = list(dict.fromkeys(parent_message_ids))
+        children: Dict[int, List[Message]] = {pid: [] for pid in parent_ids}
+        for batch in self._batches(parent_ids):
+            messages = (
+                self.db.query(Message)
+                .filter(Message.parent_message_id.in_(batch))
+                .order_by(Message.created_at, Message.id)
+                .all()
+            )
+            for message in messages:
+                children[message.parent_message_id].append(message)
+        return children
+    
+    def count_children_many(self, parent_message_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Count the child messages of several parents in one query.
+        
+        Args:
+            parent_message_ids: Parent message IDs
+            
+        Returns:
+            Number of children keyed by parent ID; every requested parent has
+            an entry
+        """
+        parent_ids = list(dict.fromkeys(parent_message_ids))
+        counts = {parent_id: 0 for parent_id in parent_ids}
+        for batch in self._batches(parent_ids):
+            rows = (
+                self.db.query(Message.parent_message_id, func.count(Message.id))
+                .filter(Message.parent_message_id.in_(batch))
+                .group_by(Message.parent_message_id)
+                .all()
+            )
+            counts.update(dict(rows))
+        return counts
+    
+    def get_subtree(self, message_id: int, depth: int) -> Optional[MessageTreeNode]:
+        """
+        Load the subtree under a message down to a limited depth.
+        
+        Each level is fetched with one query for the whole frontier, plus one
+        count query for the nodes at the depth limit, so a large tree can be
+        opened progressively.
+        
+        Args:
+            message_id: Message ID at the top of the subtree
+            depth: Number of levels below the message to load
+            
+        Returns:
+            Tree node of the message if found, None otherwise
+        """
+        message = self.get(message_id)
+        if message is None:
+            return None
+        
+        root = MessageTreeNode(message)
+        frontier = [root]
+        for _ in range(max(depth, 0)):
+            children = self.get_children_many(node.message.id for node in frontier)
+            next_frontier = []
+            for node in frontier:
+                node.children = [
+                    MessageTreeNode(child) for child in children[node.message.id]
+                ]
+                node.child_count = len(node.children)
+                next_frontier.extend(node.children)
+            frontier = next_frontier
+            if not frontier:
+                return root
+        
+        counts = self.count_children_many(node.message.id for node in frontier)
+        for node in frontier:
+            node.child_count = counts[node.message.id]
+            node.has_more = node.child_count > 0
+        return root
+    
     def get_conversation_thread(self, message_id: int) -> List[Message]:
         """
         Get the complete thread from root to the specified message.
@@ -82,18 +227,23 @@ class MessageRepository(BaseRepository[Message]):
         Returns:
             List of messages in the thread path
         """
-        thread = []
-        current_message = self.get(message_id)
-        
-        # Build thread by traversing up to root
-        while current_message:
-            thread.insert(0, current_message)
-            if current_message.parent_message_id:
-                current_message = self.get(current_message.parent_message_id)
-            else:
-                break
-        
-        return thread
+        # Walk up to the root in one recursive query instead of one per level
+        ancestors = (
+            select(Message.id, Message.parent_message_id, literal(0).label("depth"))
+            .where(Message.id == message_id)
+            .cte("ancestors", recursive=True)
+        )
+        ancestors = ancestors.union_all(
+            select(
+                Message.id, Message.parent_message_id, ancestors.c.depth + 1
+            ).where(Message.id == ancestors.c.parent_message_id)
+        )
+        return (
+            self.db.query(Message)
+            .join(ancestors, Message.id == ancestors.c.id)
+            .order_by(desc(ancestors.c.depth))
+            .all()
+        )
     
     def get_by_role(self, conversation_id: int, role: str) -> List[Message]:
         """
@@ -132,4 +282,8 @@ class MessageRepository(BaseRepository[Message]):
             self.db.query(Message)
             .filter(Message.id == message_id)
             .first()
-        )
\ No newline at end of file
+        )
+    
+    def _batches(self, ids: List[int]) -> Iterable[List[int]]:
+        for start in range(0, len(ids), _IN_CLAUSE_BATCH_SIZE):
+            yield ids[start:start + _IN_CLAUSE_BATCH_SIZE]
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Service classes for application-level subsystems.
+"""
+import importlib
+
+from .archive_service import ArchiveError, ArchiveService
+from .chat_service import ChatError, ChatModel, ChatService
+from .context_window import ContextEntry, ContextWindow, ContextWindowService
+from .file_storage import (
+    FileStorage,
+    FileTooLargeError,
+    FileValidationError,
+    StoredFile,
+)
+from .maintenance_service import (
+    ActivityMiddleware,
+    MaintenanceService,
+    MaintenanceStats,
+)
+from .startup_service import StartupReport, StartupService, schema_fingerprint
+from .write_scheduler import WriteScheduler, create_writer_engine
+
+__all__ = [
+    "ActivityMiddleware",
+    "ArchiveError",
+    "ArchiveService",
+    "ChatError",
+    "ChatModel",
+    "ChatService",
+    "ContextEntry",
+    "ContextWindow",
+    "ContextWindowService",
+    "FileStorage",
+    "FileTooLargeError",
+    "FileValidationError",
+    "MaintenanceService",
+    "MaintenanceStats",
+    "ModelClient",
+    "Priority",
+    "StartupReport",
+    "StartupService",
+    "StoredFile",
+    "TokenBucket",
+    "WriteScheduler",
+    "create_writer_engine",
+    "schema_fingerprint",
+]
+
+# The model client pulls in httpx and the HTTP/2 stack, which no request
+# needs until the model is first called, so it is imported on first access.
+_LAZY_EXPORTS = {
+    "ModelClient": ".model_client",
+    "Priority": ".model_client",
+    "TokenBucket": ".model_client",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
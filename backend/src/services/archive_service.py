@@ -0,0 +1,359 @@
+"""
+Archival of cold conversations into attached SQLite shard files.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from ..database import data_path
+from ..models.conversation import Conversation
+from ..repositories.conversation_repository import ConversationRepository
+
+logger = logging.getLogger(__name__)
+
+# Conversations not updated for this many days are moved to a shard
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+
+_SHARD_ALIAS = "archive_shard"
+_ARCHIVED_TABLES = ("messages", "attached_files")
+
+
+class ArchiveError(Exception):
+    """Raised when conversations cannot be archived safely."""
+
+
+class ArchiveService:
+    """
+    Moves cold conversations between the main database and shard files.
+
+    The conversation row stays in the main database and acts as the hot
+    index, so listings and title searches keep covering both tiers. Its
+    messages and attachments move to a shard file per month of
+    ``updated_at``, which is attached to the main connection while rows are
+    copied. Reopening an archived conversation restores its rows.
+
+    Archive and restore write through ``engine`` rather than the write
+    scheduler: ATTACH is not allowed inside a transaction, and the scheduler
+    runs every write inside its batch transaction. Each move is one short
+    transaction that waits for the write lock on the busy timeout like a
+    writer in another worker process.
+
+    Args:
+        engine: Engine bound to the main SQLite database
+        archive_dir: Directory holding the shard files
+    """
+
+    def __init__(self, engine: Engine, archive_dir: Optional[str] = None):
+        self.engine = engine
+        self.archive_dir = archive_dir or data_path("archive")
+
+    def archive_stale(
+        self, older_than_days: int = ARCHIVE_AFTER_DAYS, limit: Optional[int] = None
+    ) -> int:
+        """
+        Archive every conversation not updated within the threshold.
+
+        Each conversation is moved in its own transaction, so the write lock
+        is only held for one conversation's rows at a time.
+
+        Args:
+            older_than_days: Age in days of ``updated_at`` to archive at
+            limit: Archive at most this many conversations, oldest first
+
+        Returns:
+            Number of conversations archived
+        """
+        if not self.ids_are_never_reused():
+            logger.warning(
+                "Not archiving: messages and attached_files lack AUTOINCREMENT "
+                "until the schema is upgraded"
+            )
+            return 0
+        stale = self.stale_conversations(older_than_days, limit)
+        for conversation_id, shard_name in stale:
+            self.archive([conversation_id], shard_name)
+        return len(stale)
+
+    def stale_conversations(
+        self, older_than_days: int = ARCHIVE_AFTER_DAYS, limit: Optional[int] = None
+    ) -> List[Tuple[int, str]]:
+        """
+        Find conversations not updated within the threshold, oldest first.
+
+        Args:
+            older_than_days: Age in days of ``updated_at`` to archive at
+            limit: Maximum number of conversations to return
+
+        Returns:
+            ``(conversation_id, shard_name)`` pairs
+        """
+        threshold = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(Conversation.id, Conversation.updated_at)
+                .where(
+                    Conversation.updated_at < threshold,
+                    Conversation.archive_shard.is_(None),
+                )
+                .order_by(Conversation.updated_at)
+                .limit(limit)
+            ).all()
+        return [
+            (conversation_id, self._shard_name(updated_at))
+            for conversation_id, updated_at in rows
+        ]
+
+    def archive(self, conversation_ids: List[int], shard_name: str) -> None:
+        """
+        Move the messages and attachments of conversations into a shard.
+
+        Args:
+            conversation_ids: IDs of the conversations to archive
+            shard_name: File name of the shard under the archive directory
+
+        Raises:
+            ArchiveError: If the main tables could reuse the archived IDs
+            SQLAlchemyError: If copying the rows fails; nothing is moved then
+        """
+        if not self.ids_are_never_reused():
+            raise ArchiveError(
+                "messages and attached_files need AUTOINCREMENT before "
+                "conversations can be archived"
+            )
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self._attached(shard_name) as conn:
+            self._prepare_shard(conn)
+            with conn.begin():
+                self._copy_rows(conn, "main", _SHARD_ALIAS, conversation_ids)
+                self._delete_rows(conn, "main", conversation_ids)
+                conn.execute(
+                    update(Conversation)
+                    .where(Conversation.id.in_(conversation_ids))
+                    .values(
+                        archive_shard=shard_name,
+                        archived_at=datetime.now(timezone.utc),
+                        # Archival must not count as activity
+                        updated_at=Conversation.updated_at,
+                    )
+                )
+        logger.info(
+            "Archived %d conversations into %s", len(conversation_ids), shard_name
+        )
+
+    def ids_are_never_reused(self) -> bool:
+        """
+        Whether the archived tables use AUTOINCREMENT.
+
+        Without it SQLite hands out the largest remaining ID plus one, so new
+        rows can take the IDs of archived ones and restoring them would fail.
+        ``create_all`` only applies it to new tables; older databases get it
+        when ``StartupService.ensure_schema`` rebuilds the tables.
+
+        Returns:
+            True if archived IDs cannot be taken by new rows
+        """
+        with self.engine.connect() as conn:
+            ddl = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' "
+                f"AND name IN ({', '.join('?' for _ in _ARCHIVED_TABLES)})",
+                _ARCHIVED_TABLES,
+            ).scalars().all()
+        return len(ddl) == len(_ARCHIVED_TABLES) and all(
+            "AUTOINCREMENT" in sql.upper() for sql in ddl
+        )
+
+    def restore(self, conversation_id: int) -> bool:
+        """
+        Move the rows of an archived conversation back into the main database.
+
+        Args:
+            conversation_id: Conversation ID
+
+        Returns:
+            True if the conversation was restored, False if it was not archived
+        """
+        with self.engine.connect() as conn:
+            shard_name = conn.execute(
+                select(Conversation.archive_shard).where(
+                    Conversation.id == conversation_id
+                )
+            ).scalar()
+        if shard_name is None:
+            return False
+
+        with self._attached(shard_name) as conn:
+            self._prepare_shard(conn)
+            with conn.begin():
+                self._copy_rows(conn, _SHARD_ALIAS, "main", [conversation_id])
+                self._delete_rows(conn, _SHARD_ALIAS, [conversation_id])
+                conn.execute(
+                    update(Conversation)
+                    .where(Conversation.id == conversation_id)
+                    .values(
+                        archive_shard=None,
+                        archived_at=None,
+                        updated_at=Conversation.updated_at,
+                    )
+                )
+        logger.info("Restored conversation %d from %s", conversation_id, shard_name)
+        return True
+
+    def restore_message(self, message_id: int) -> bool:
+        """
+        Restore the conversation holding an archived message.
+
+        Only the shards referenced by archived conversations are searched,
+        each with a primary key lookup.
+
+        Args:
+            message_id: Message ID
+
+        Returns:
+            True if the message was found in a shard and restored
+        """
+        with self.engine.connect() as conn:
+            shard_names = conn.execute(
+                select(Conversation.archive_shard)
+                .where(Conversation.archive_shard.is_not(None))
+                .distinct()
+            ).scalars().all()
+
+        for shard_name in shard_names:
+            if not os.path.exists(os.path.join(self.archive_dir, shard_name)):
+                continue
+            with self._attached(shard_name) as conn:
+                conversation_id = conn.exec_driver_sql(
+                    f"SELECT conversation_id FROM {_SHARD_ALIAS}.messages "
+                    "WHERE id = ?",
+                    (int(message_id),),
+                ).scalar()
+            if conversation_id is not None:
+                return self.restore(conversation_id)
+        return False
+
+    def open_conversation(
+        self, db: Session, conversation_id: int
+    ) -> Optional[Conversation]:
+        """
+        Get a conversation with its messages, restoring it if archived.
+
+        Args:
+            db: Database session used to load the conversation
+            conversation_id: Conversation ID
+
+        Returns:
+            Conversation with messages if found, None otherwise
+        """
+        repo = ConversationRepository(db)
+        conversation = repo.get(conversation_id)
+        if conversation is None or not conversation.is_archived:
+            return conversation
+        self.restore(conversation_id)
+        db.expire(conversation)
+        return repo.get_with_messages(conversation_id)
+
+    def _shard_name(self, updated_at: datetime) -> str:
+        return f"conversations_{updated_at:%Y_%m}.sqlite"
+
+    def _attached(self, shard_name: str) -> "_AttachedShard":
+        return _AttachedShard(
+            self.engine, os.path.join(self.archive_dir, shard_name)
+        )
+
+    def _prepare_shard(self, conn: Connection) -> None:
+        # Shard tables are plain copies of the main tables; columns added to
+        # the main schema later are added to existing shards on first use.
+        for table in _ARCHIVED_TABLES:
+            conn.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS {_SHARD_ALIAS}.{table} "
+                f"AS SELECT * FROM main.{table} WHERE 0"
+            )
+            shard_columns = set(self._columns(conn, _SHARD_ALIAS, table))
+            for column in self._columns(conn, "main", table):
+                if column not in shard_columns:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {_SHARD_ALIAS}.{table} ADD COLUMN {column}"
+                    )
+        conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS {_SHARD_ALIAS}.ix_messages_conversation "
+            "ON messages (conversation_id)"
+        )
+        conn.commit()
+
+    def _columns(self, conn: Connection, schema: str, table: str) -> List[str]:
+        rows = conn.exec_driver_sql(f"PRAGMA {schema}.table_info({table})").all()
+        return [row[1] for row in rows]
+
+    def _copy_rows(
+        self, conn: Connection, source: str, target: str, conversation_ids: List[int]
+    ) -> None:
+        id_list = self._id_list(conversation_ids)
+        message_columns = ", ".join(self._columns(conn, "main", "messages"))
+        file_columns = ", ".join(self._columns(conn, "main", "attached_files"))
+        conn.exec_driver_sql(
+            f"INSERT INTO {target}.messages ({message_columns}) "
+            f"SELECT {message_columns} FROM {source}.messages "
+            f"WHERE conversation_id IN ({id_list})"
+        )
+        conn.exec_driver_sql(
+            f"INSERT INTO {target}.attached_files ({file_columns}) "
+            f"SELECT {file_columns} FROM {source}.attached_files "
+            f"WHERE message_id IN (SELECT id FROM {source}.messages "
+            f"WHERE conversation_id IN ({id_list}))"
+        )
+
+    def _delete_rows(
+        self, conn: Connection, schema: str, conversation_ids: List[int]
+    ) -> None:
+        id_list = self._id_list(conversation_ids)
+        conn.exec_driver_sql(
+            f"DELETE FROM {schema}.attached_files WHERE message_id IN "
+            f"(SELECT id FROM {schema}.messages WHERE conversation_id IN ({id_list}))"
+        )
+        conn.exec_driver_sql(
+            f"DELETE FROM {schema}.messages WHERE conversation_id IN ({id_list})"
+        )
+
+    def _id_list(self, conversation_ids: List[int]) -> str:
+        # IDs are interpolated into SQL, so only integers are accepted.
+        return ", ".join(str(int(conv_id)) for conv_id in conversation_ids)
+
+
+class _AttachedShard:
+    """
+    Context manager yielding a connection with a shard file attached.
+
+    ATTACH is not allowed inside a transaction, so it runs on a fresh
+    connection before any statement opens one.
+    """
+
+    def __init__(self, engine: Engine, shard_path: str):
+        self.engine = engine
+        self.shard_path = shard_path
+        self.conn: Optional[Connection] = None
+
+    def __enter__(self) -> Connection:
+        self.conn = self.engine.connect()
+        try:
+            self.conn.exec_driver_sql(
+                f"ATTACH DATABASE ? AS {_SHARD_ALIAS}", (self.shard_path,)
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.close()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self.conn.in_transaction():
+                self.conn.rollback()
+            self.conn.exec_driver_sql(f"DETACH DATABASE {_SHARD_ALIAS}")
+            self.conn.commit()
+        finally:
+            self.conn.close()
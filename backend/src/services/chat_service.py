@@ -0,0 +1,240 @@
+"""
+Chat turn handling behind the WebSocket chat endpoint.
+"""
+import asyncio
+import logging
+import os
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Protocol
+
+from sqlalchemy.orm import Session
+
+from ..models.attached_file import AttachedFile
+from ..models.conversation import Conversation
+from ..models.message import Message
+from ..repositories.message_repository import MessageRepository
+from .archive_service import ArchiveService
+from .context_window import ContextWindowService
+from .file_storage import FileStorage, FileValidationError
+from .write_scheduler import WriteScheduler
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "32000"))
+
+
+class ChatModel(Protocol):
+    """
+    Interface of a model that streams a reply to a conversation branch.
+    """
+
+    def stream(self, history: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Stream the reply to a branch.
+
+        Args:
+            history: ``{"role", "content"}`` entries from root to the new
+                user message
+
+        Yields:
+            Pieces of the reply text
+        """
+        ...
+
+
+class ChatError(Exception):
+    """Raised when a chat message cannot be processed."""
+
+
+class _ConversationArchived(Exception):
+    """Raised inside a write when the conversation's messages are in a shard."""
+
+
+def serialize_message(message: Message) -> Dict[str, Any]:
+    """
+    Convert a message to the payload sent in ``stream_end``.
+
+    Args:
+        message: Message to serialize
+
+    Returns:
+        Dictionary matching the WebSocket API message object
+    """
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "parent_message_id": message.parent_message_id,
+        "role": message.role,
+        "content": message.content,
+        "node_summary": message.node_summary,
+        "created_at": message.created_at.isoformat() if message.created_at else None,
+    }
+
+
+class ChatService:
+    """
+    Runs one chat turn: stores the user message, streams the model reply and
+    stores the reply.
+
+    Writes go through the write scheduler; reads use short-lived sessions so
+    many open WebSocket connections do not hold pooled connections. A turn on
+    an archived conversation first restores its messages from the shard.
+
+    Args:
+        session_factory: Factory for read sessions
+        write_scheduler: Running write scheduler
+        model: Model streaming the replies
+        context_token_budget: Token budget for the history sent to the model
+        archive_service: Service restoring archived conversations
+        file_storage: Storage holding uploads referenced by ``storage_path``
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        write_scheduler: WriteScheduler,
+        model: Optional[ChatModel],
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        archive_service: Optional[ArchiveService] = None,
+        file_storage: Optional[FileStorage] = None,
+    ):
+        self.session_factory = session_factory
+        self.write_scheduler = write_scheduler
+        self.model = model
+        self.context_token_budget = context_token_budget
+        self.archive_service = archive_service
+        self.file_storage = file_storage
+
+    async def stream_turn(
+        self, conversation_id: int, payload: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Handle a ``chat_message`` and yield the server-to-client messages.
+
+        Args:
+            conversation_id: Conversation ID from the WebSocket path
+            payload: Decoded ``chat_message`` payload
+
+        Yields:
+            ``stream_chunk`` messages followed by one ``stream_end``
+
+        Raises:
+            ChatError: If the payload or conversation is invalid
+        """
+        if self.model is None:
+            raise ChatError("No chat model is configured")
+        content = payload.get("content")
+        if payload.get("type") != "chat_message" or not isinstance(content, str):
+            raise ChatError("Expected a chat_message with text content")
+        if not content.strip():
+            raise ChatError("Message content must not be empty")
+        files = payload.get("files") or []
+        if not isinstance(files, list) or not all(
+            isinstance(attached, dict)
+            and isinstance(attached.get("file_name"), str)
+            and isinstance(attached.get("gemini_file_uri"), str)
+            and isinstance(attached.get("storage_path") or "", str)
+            for attached in files
+        ):
+            raise ChatError("files must list file_name and gemini_file_uri")
+        attachments = [self._attachment(attached) for attached in files]
+        parent_message_id = payload.get("parent_message_id")
+        if parent_message_id is not None:
+            try:
+                parent_message_id = int(parent_message_id)
+            except (TypeError, ValueError):
+                raise ChatError("parent_message_id must be a message ID")
+
+        def create_user_message(db: Session) -> int:
+            return self._create_user_message(
+                db, conversation_id, parent_message_id, content, attachments
+            )
+
+        try:
+            user_message_id = await self.write_scheduler.submit(create_user_message)
+        except _ConversationArchived:
+            # Restoring writes through its own connection, so it cannot run
+            # inside the scheduler's transaction.
+            await asyncio.to_thread(self.archive_service.restore, conversation_id)
+            user_message_id = await self.write_scheduler.submit(create_user_message)
+        history = await asyncio.to_thread(self._build_history, user_message_id)
+
+        reply_parts = []
+        async for chunk in self.model.stream(history):
+            reply_parts.append(chunk)
+            yield {"type": "stream_chunk", "content": chunk}
+
+        reply = await self.write_scheduler.submit(
+            lambda db: serialize_message(
+                MessageRepository(db).create({
+                    "conversation_id": conversation_id,
+                    "parent_message_id": user_message_id,
+                    "role": "model",
+                    "content": "".join(reply_parts),
+                })
+            )
+        )
+        yield {"type": "stream_end", "message": reply}
+
+    def _create_user_message(
+        self,
+        db: Session,
+        conversation_id: int,
+        parent_message_id: Optional[int],
+        content: str,
+        attachments: List[Dict[str, Any]],
+    ) -> int:
+        conversation = db.get(Conversation, conversation_id)
+        if conversation is None:
+            raise ChatError(f"Conversation {conversation_id} not found")
+        if conversation.is_archived:
+            if self.archive_service is None:
+                raise ChatError(f"Conversation {conversation_id} is archived")
+            raise _ConversationArchived(conversation_id)
+        repo = MessageRepository(db)
+        if parent_message_id is None:
+            # Without an explicit fork point the turn continues the latest branch
+            latest = repo.get_latest(conversation_id)
+            parent_message_id = latest.id if latest else None
+        else:
+            parent = repo.get(parent_message_id)
+            if parent is None or parent.conversation_id != conversation_id:
+                raise ChatError(f"Message {parent_message_id} not found")
+
+        message = repo.create({
+            "conversation_id": conversation_id,
+            "parent_message_id": parent_message_id,
+            "role": "user",
+            "content": content,
+        })
+        for attachment in attachments:
+            db.add(AttachedFile(message_id=message.id, **attachment))
+        db.flush()
+        return message.id
+
+    def _attachment(self, attached: Dict[str, str]) -> Dict[str, Any]:
+        values: Dict[str, Any] = {
+            "file_name": attached["file_name"],
+            "gemini_file_uri": attached["gemini_file_uri"],
+        }
+        storage_path = attached.get("storage_path")
+        if storage_path is None:
+            return values
+        if self.file_storage is None:
+            raise ChatError("File storage is not configured")
+        # Metadata comes from the stored file, not from the client
+        try:
+            values.update(asdict(self.file_storage.describe(storage_path)))
+        except FileValidationError:
+            raise ChatError(f"Unknown stored file {storage_path!r}")
+        return values
+
+    def _build_history(self, user_message_id: int) -> List[Dict[str, str]]:
+        with self.session_factory() as db:
+            window = ContextWindowService(db).build(
+                user_message_id, self.context_token_budget
+            )
+            return [
+                {"role": entry.message.role, "content": entry.text}
+                for entry in window.entries
+            ]
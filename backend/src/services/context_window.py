@@ -0,0 +1,140 @@
+"""
+Context window selection along a conversation branch using cached token counts.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models.message import Message
+from ..repositories.message_repository import MessageRepository
+
+
+@dataclass
+class ContextEntry:
+    """
+    One ancestor selected for the model context.
+
+    Attributes:
+        message: Selected message
+        use_summary: Whether node_summary replaces the full content
+        token_count: Tokens this entry contributes
+    """
+    message: Message
+    use_summary: bool
+    token_count: int
+
+    @property
+    def text(self) -> str:
+        """Text to send to the model for this entry."""
+        return self.message.node_summary if self.use_summary else self.message.content
+
+
+@dataclass
+class ContextWindow:
+    """
+    Ancestors of a leaf selected to fit a token budget.
+
+    Attributes:
+        entries: Selected entries ordered from root to leaf
+        token_count: Total tokens of the selected entries
+        truncated: Whether any ancestor was summarized or dropped
+    """
+    entries: List[ContextEntry]
+    token_count: int
+    truncated: bool
+
+
+class ContextWindowService:
+    """
+    Picks which ancestors of a leaf message fit into the model context.
+
+    Every message stores its own token count and the cumulative count from
+    the root, so checking whether a whole branch fits is a single lookup on
+    the leaf. When it does not fit, the root stays pinned, the most recent
+    turns are kept in full, and older turns fall back to their summaries or
+    are dropped. Nothing is re-tokenized.
+
+    Args:
+        db: Database session
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.message_repo = MessageRepository(db)
+
+    def branch_token_count(self, leaf_message_id: int) -> Optional[int]:
+        """
+        Get the total tokens from the root through a message.
+
+        Args:
+            leaf_message_id: Leaf message ID
+
+        Returns:
+            Cumulative token count, or None if the message does not exist
+        """
+        leaf = self.message_repo.get(leaf_message_id)
+        return leaf.path_token_count if leaf else None
+
+    def build(self, leaf_message_id: int, token_budget: int) -> ContextWindow:
+        """
+        Select the ancestors of a leaf that fit into a token budget.
+
+        The leaf is always included, even if it alone exceeds the budget.
+
+        Args:
+            leaf_message_id: Leaf message ID
+            token_budget: Maximum tokens for the selected history
+
+        Returns:
+            Selected context window, empty if the leaf does not exist
+        """
+        thread = self.message_repo.get_conversation_thread(leaf_message_id)
+        if not thread:
+            return ContextWindow(entries=[], token_count=0, truncated=False)
+
+        leaf = thread[-1]
+        if leaf.path_token_count <= token_budget:
+            entries = [ContextEntry(m, False, m.token_count) for m in thread]
+            return ContextWindow(entries, leaf.path_token_count, truncated=False)
+
+        selected = [ContextEntry(leaf, False, leaf.token_count)]
+        remaining = token_budget - leaf.token_count
+        pinned_root = None
+        if len(thread) > 1:
+            pinned_root = self._fit(thread[0], remaining, allow_full=True)
+            if pinned_root:
+                remaining -= pinned_root.token_count
+
+        # Recent turns stay verbatim until one no longer fits; from then on
+        # older turns are only represented by their summaries.
+        allow_full = True
+        for message in reversed(thread[1:-1]):
+            entry = self._fit(message, remaining, allow_full)
+            if entry is None:
+                allow_full = False
+                continue
+            if entry.use_summary:
+                allow_full = False
+            selected.append(entry)
+            remaining -= entry.token_count
+
+        if pinned_root:
+            selected.append(pinned_root)
+        selected.reverse()
+        return ContextWindow(
+            entries=selected,
+            token_count=sum(entry.token_count for entry in selected),
+            truncated=True,
+        )
+
+    def _fit(
+        self, message: Message, remaining: int, allow_full: bool
+    ) -> Optional[ContextEntry]:
+        if allow_full and message.token_count <= remaining:
+            return ContextEntry(message, False, message.token_count)
+        summary_tokens = message.summary_token_count
+        if message.node_summary and summary_tokens is not None:
+            if summary_tokens <= remaining:
+                return ContextEntry(message, True, summary_tokens)
+        return None
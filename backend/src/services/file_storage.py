@@ -0,0 +1,425 @@
+"""
+Chunked local storage for uploaded files.
+"""
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from ..database import data_path
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart before 0.0.13 only installs the ``multipart`` name
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+# Leading bytes of the file types accepted for multimodal input
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf", ".pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+)
+_SNIFF_BYTES = 16
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class FileValidationError(ValueError):
+    """Raised when an upload is not an accepted file."""
+
+
+class FileTooLargeError(FileValidationError):
+    """Raised when an upload exceeds the size limit."""
+
+
+@dataclass
+class StoredFile:
+    """
+    Metadata of a file written to local storage.
+
+    Attributes:
+        storage_path: Path relative to the storage root
+        content_hash: SHA-256 hex digest of the content
+        mime_type: MIME type detected from the content
+        size_bytes: File size
+    """
+    storage_path: str
+    content_hash: str
+    mime_type: str
+    size_bytes: int
+
+
+class _MultipartFile:
+    """
+    Extracts one file field from a ``multipart/form-data`` body as it streams.
+    """
+
+    def __init__(self, content_type: str, field_name: str):
+        mime_type, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if mime_type != b"multipart/form-data" or not boundary:
+            raise FileValidationError("Expected a multipart/form-data upload")
+        self.field_name = field_name.encode()
+        self.file_name: Optional[str] = None
+        self.found = False
+        self._in_field = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._pending: List[bytes] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def chunks(self, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Feed the body to the parser and yield the file field's content.
+
+        Args:
+            body: Async iterator over the raw request body
+
+        Yields:
+            Pieces of the file content
+        """
+        async for chunk in body:
+            self._parser.write(chunk)
+            if self._pending:
+                data = b"".join(self._pending)
+                self._pending.clear()
+                yield data
+        self._parser.finalize()
+        if not self.found:
+            raise FileValidationError(
+                f"Missing file field '{self.field_name.decode()}'"
+            )
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(
+            self._headers.get(b"content-disposition", b"")
+        )
+        # Only the first part of the field is stored
+        self._in_field = not self.found and options.get(b"name") == self.field_name
+        if self._in_field:
+            self.found = True
+            file_name = options.get(b"filename")
+            if file_name is not None:
+                self.file_name = file_name.decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_field:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        self._in_field = False
+
+
+def sniff_mime_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    Detect the MIME type of a file from its first bytes.
+
+    Args:
+        head: Leading bytes of the file
+
+    Returns:
+        ``(mime_type, extension)`` if the type is accepted, None otherwise
+    """
+    for signature, mime_type, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return None
+
+
+class FileStorage:
+    """
+    Stores uploads on disk in fixed-size chunks.
+
+    Content is streamed to a temporary file while it is hashed and its type
+    is checked from the first chunk, so memory use per upload does not grow
+    with the file size. Files are content-addressed by SHA-256, which also
+    deduplicates repeated uploads. Downloads use the server's sendfile
+    support when available and memory-mapped reads for byte ranges.
+
+    Args:
+        root_dir: Directory holding the stored files
+        chunk_size: Bytes read and written per step
+        max_size: Largest accepted upload in bytes
+    """
+
+    def __init__(
+        self,
+        root_dir: Optional[str] = None,
+        chunk_size: int = CHUNK_SIZE,
+        max_size: int = MAX_UPLOAD_BYTES,
+    ):
+        self.root_dir = root_dir or data_path("uploaded_files")
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+
+    def path_for(self, storage_path: str) -> str:
+        """
+        Resolve a stored file's relative path inside the storage root.
+
+        Args:
+            storage_path: Path relative to the storage root
+
+        Returns:
+            Absolute file path
+
+        Raises:
+            FileValidationError: If the path escapes the storage root
+        """
+        root = os.path.realpath(self.root_dir)
+        path = os.path.realpath(os.path.join(root, storage_path))
+        if os.path.commonpath([root, path]) != root:
+            raise FileValidationError("Invalid storage path")
+        return path
+
+    def describe(self, storage_path: str) -> StoredFile:
+        """
+        Get the metadata of a stored file from its content address.
+
+        Only files written by ``save`` are accepted: the path must be the
+        content-addressed location of an existing file of an accepted type.
+        The metadata is taken from the file itself, never from the caller.
+
+        Args:
+            storage_path: Path relative to the storage root
+
+        Returns:
+            Metadata of the stored file
+
+        Raises:
+            FileValidationError: If the path is not a stored upload
+        """
+        path = self.path_for(storage_path)
+        content_hash, extension = os.path.splitext(os.path.basename(path))
+        relative_path = os.path.relpath(path, os.path.realpath(self.root_dir))
+        expected_path = os.path.join(content_hash[:2], content_hash + extension)
+        if (
+            not _HASH_PATTERN.match(content_hash)
+            or relative_path != expected_path
+            or not os.path.isfile(path)
+        ):
+            raise FileValidationError("Unknown stored file")
+        with open(path, "rb") as stored:
+            head = stored.read(_SNIFF_BYTES)
+            size = os.fstat(stored.fileno()).st_size
+        mime_type, detected_extension = self._validate(head)
+        if detected_extension != extension:
+            raise FileValidationError("Unknown stored file")
+        return StoredFile(relative_path, content_hash, mime_type, size)
+
+    async def save_multipart(
+        self, content_type: str, body: AsyncIterator[bytes], field_name: str = "file"
+    ) -> Tuple[Optional[str], StoredFile]:
+        """
+        Stream the file field of a ``multipart/form-data`` body into storage.
+
+        The body is parsed as it arrives instead of being spooled to a
+        temporary file first, so the size limit applies before an oversized
+        upload reaches the disk and each upload is written once.
+
+        Args:
+            content_type: Content-Type header of the request
+            body: Async iterator over the raw request body
+            field_name: Form field holding the file
+
+        Returns:
+            ``(file_name, stored_file)`` with the client's file name
+
+        Raises:
+            FileValidationError: If the body has no accepted file in the field
+            FileTooLargeError: If the file exceeds the size limit
+        """
+        upload = _MultipartFile(content_type, field_name)
+        stored = await self.save(upload.chunks(body))
+        return upload.file_name, stored
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> StoredFile:
+        """
+        Write a stream of chunks into storage.
+
+        Args:
+            chunks: Async iterator of file content
+
+        Returns:
+            Metadata of the stored file
+
+        Raises:
+            FileValidationError: If the content type is not accepted
+            FileTooLargeError: If the file exceeds the size limit
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root_dir, suffix=".part")
+        digest = hashlib.sha256()
+        head = b""
+        detected = None
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise FileTooLargeError(
+                            f"File exceeds the {self.max_size} byte limit"
+                        )
+                    if detected is None:
+                        head = (head + chunk)[:_SNIFF_BYTES]
+                        if len(head) >= _SNIFF_BYTES:
+                            detected = self._validate(head)
+                    await asyncio.to_thread(
+                        self._write_chunk, temp_file, digest, chunk
+                    )
+            if detected is None:
+                detected = self._validate(head)
+
+            content_hash = digest.hexdigest()
+            mime_type, extension = detected
+            storage_path = os.path.join(content_hash[:2], content_hash + extension)
+            final_path = self.path_for(storage_path)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        logger.info(
+            "Stored %s upload of %d bytes as %s", mime_type, size, storage_path
+        )
+        return StoredFile(storage_path, content_hash, mime_type, size)
+
+    def iter_range(
+        self, storage_path: str, start: int = 0, end: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """
+        Read a byte range of a stored file through a memory map.
+
+        Args:
+            storage_path: Path relative to the storage root
+            start: First byte offset
+            end: Offset after the last byte, defaults to the file size
+
+        Yields:
+            Chunks of at most ``chunk_size`` bytes
+        """
+        with open(self.path_for(storage_path), "rb") as stored:
+            size = os.fstat(stored.fileno()).st_size
+            end = size if end is None else min(end, size)
+            if start >= end:
+                return
+            with mmap.mmap(stored.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(start, end, self.chunk_size):
+                    yield mapped[offset:min(offset + self.chunk_size, end)]
+
+    def file_response(
+        self,
+        storage_path: str,
+        media_type: str,
+        file_name: str,
+        range_header: Optional[str] = None,
+    ) -> Response:
+        """
+        Build a download response, honoring a single HTTP byte range.
+
+        Args:
+            storage_path: Path relative to the storage root
+            media_type: MIME type of the file
+            file_name: Download file name
+            range_header: Value of the request's Range header
+
+        Returns:
+            Full response, 206 partial response, or 416 for an invalid range
+        """
+        path = self.path_for(storage_path)
+        if not range_header:
+            # FileResponse hands the path to the server (pathsend/sendfile)
+            return FileResponse(
+                path,
+                media_type=media_type,
+                filename=file_name,
+                headers={"accept-ranges": "bytes"},
+            )
+
+        size = os.path.getsize(path)
+        byte_range = self._parse_range(range_header, size)
+        if byte_range is None:
+            return Response(
+                status_code=416, headers={"content-range": f"bytes */{size}"}
+            )
+        start, end = byte_range
+        return StreamingResponse(
+            self.iter_range(storage_path, start, end),
+            status_code=206,
+            media_type=media_type,
+            headers={
+                "accept-ranges": "bytes",
+                "content-range": f"bytes {start}-{end - 1}/{size}",
+                "content-length": str(end - start),
+            },
+        )
+
+    def _validate(self, head: bytes) -> Tuple[str, str]:
+        detected = sniff_mime_type(head)
+        if detected is None:
+            raise FileValidationError("Only PDF and image files are accepted")
+        return detected
+
+    def _write_chunk(self, temp_file: BinaryIO, digest, chunk: bytes) -> None:
+        digest.update(chunk)
+        temp_file.write(chunk)
+
+    def _parse_range(self, range_header: str, size: int) -> Optional[Tuple[int, int]]:
+        match = _RANGE_PATTERN.match(range_header.strip())
+        if not match or size == 0:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            if int(last) == 0:
+                return None
+            return max(size - int(last), 0), size
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+        if start >= size or start >= end:
+            return None
+        return start, end
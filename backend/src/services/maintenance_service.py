@@ -0,0 +1,449 @@
+"""
+Background SQLite maintenance run during idle windows.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..repositories.conversation_repository import ConversationRepository
+from .archive_service import ArchiveService
+from .write_scheduler import WriteOperation, WriteScheduler
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum value of a database created with INCREMENTAL
+_AUTO_VACUUM_INCREMENTAL = 2
+
+# Seconds between writes of the shared activity timestamp
+_SHARED_TOUCH_INTERVAL = 1.0
+
+
+def default_state_path(engine: Engine) -> Optional[str]:
+    """
+    Get the file shared by every worker process using a SQLite database.
+
+    Args:
+        engine: Engine bound to the SQLite database
+
+    Returns:
+        Path next to the database file, None for in-memory databases
+    """
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or not database or database == ":memory:":
+        return None
+    return f"{database}-maintenance"
+
+
+@dataclass
+class MaintenanceStats:
+    """
+    Outcome of one maintenance run.
+
+    Attributes:
+        started_at: Start timestamp
+        duration_ms: Wall time of the run
+        freelist_pages_before: Free pages before incremental vacuum
+        freelist_pages_after: Free pages after incremental vacuum
+        optimized: Whether PRAGMA optimize ran
+        wal_pages: Pages in the WAL when it was checkpointed
+        wal_pages_checkpointed: Pages copied back into the database
+        conversations_reconciled: Conversations whose message stats were
+            corrected, None if reconciliation did not run
+        conversations_archived: Cold conversations moved to archive shards
+        skipped: Steps skipped because of the time budget or configuration;
+            ``locked`` when another worker was running maintenance
+    """
+    started_at: datetime
+    duration_ms: float = 0.0
+    freelist_pages_before: int = 0
+    freelist_pages_after: int = 0
+    optimized: bool = False
+    wal_pages: int = 0
+    wal_pages_checkpointed: int = 0
+    conversations_reconciled: Optional[int] = None
+    conversations_archived: int = 0
+    skipped: List[str] = field(default_factory=list)
+
+
+class MaintenanceService:
+    """
+    Runs incremental vacuum, statistics refresh and WAL checkpoints.
+
+    A run only starts when no request has been in flight for
+    ``idle_seconds``, and every step checks the remaining ``time_budget`` so
+    a run never holds the database long enough to affect request latency.
+    Worker processes share the database, so each one records its activity
+    in the modification time of a state file next to it, and a run holds an
+    exclusive lock on that file so only one worker does maintenance at once.
+    Vacuum work is split into chunks of ``vacuum_step_pages`` pages. The
+    denormalized conversation stats are reconciled at most once every
+    ``reconcile_interval`` seconds, ``reconcile_batch_size`` conversation IDs
+    per transaction. A pass cut short by the time budget resumes from the
+    next batch on the following run. Reconciliation batches go through the
+    write scheduler when one is running, like every other write of the
+    process. With an archive service, each run also moves up to
+    ``archive_batch_size`` cold conversations into shards, one per
+    transaction while the time budget lasts. Archival bypasses the write
+    scheduler because ATTACH cannot run inside its batch transaction; it
+    only happens in idle windows and waits for the write lock like any
+    other writer.
+
+    Args:
+        engine: Engine bound to the SQLite database
+        interval: Seconds between idle checks
+        idle_seconds: Quiet period required before a run
+        time_budget: Seconds a single run may take
+        vacuum_step_pages: Pages released per incremental vacuum statement
+        reconcile_interval: Seconds between conversation stats reconciliations
+        reconcile_batch_size: Conversation IDs reconciled per transaction
+        archive_service: Service archiving cold conversations
+        archive_batch_size: Most conversations archived per run
+        write_scheduler: Scheduler committing the reconciliation batches;
+            without a running one they are committed directly
+        state_path: File shared by the workers, derived from the database
+            path by default
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        interval: float = 300.0,
+        idle_seconds: float = 30.0,
+        time_budget: float = 0.5,
+        vacuum_step_pages: int = 256,
+        reconcile_interval: float = 3600.0,
+        reconcile_batch_size: int = 500,
+        archive_service: Optional[ArchiveService] = None,
+        archive_batch_size: int = 20,
+        write_scheduler: Optional[WriteScheduler] = None,
+        state_path: Optional[str] = None,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.time_budget = time_budget
+        self.vacuum_step_pages = vacuum_step_pages
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_batch_size = reconcile_batch_size
+        self._last_reconciled: Optional[float] = None
+        # First conversation ID of the next batch of an unfinished pass
+        self._reconcile_from = 0
+        self.archive_service = archive_service
+        self.archive_batch_size = archive_batch_size
+        self.write_scheduler = write_scheduler
+        self.state_path = state_path or default_state_path(engine)
+        self.last_stats: Optional[MaintenanceStats] = None
+        self._in_flight = 0
+        self._last_activity = time.monotonic()
+        self._last_shared_touch: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def request_started(self) -> None:
+        """
+        Record that a request started.
+        """
+        self._in_flight += 1
+        self.touch()
+
+    def request_finished(self) -> None:
+        """
+        Record that a request finished.
+        """
+        self._in_flight -= 1
+        self.touch()
+
+    def touch(self) -> None:
+        """
+        Record activity that is not a request, such as a WebSocket message.
+        """
+        now = time.monotonic()
+        self._last_activity = now
+        if self.state_path is None:
+            return
+        if (
+            self._last_shared_touch is not None
+            and now - self._last_shared_touch < _SHARED_TOUCH_INTERVAL
+        ):
+            return
+        self._last_shared_touch = now
+        try:
+            with open(self.state_path, "a"):
+                os.utime(self.state_path)
+        except OSError:
+            logger.debug("Could not record activity in %s", self.state_path)
+
+    def is_idle(self) -> bool:
+        """
+        Whether no request is running and every worker has been quiet long enough.
+        """
+        quiet_for = time.monotonic() - self._last_activity
+        if self._in_flight or quiet_for < self.idle_seconds:
+            return False
+        if self.state_path is None:
+            return True
+        try:
+            shared_quiet_for = time.time() - os.path.getmtime(self.state_path)
+        except OSError:
+            return True
+        return shared_quiet_for >= self.idle_seconds
+
+    async def start(self) -> None:
+        """
+        Start the periodic maintenance task. No-op for non-SQLite engines.
+        """
+        if self.engine.dialect.name != "sqlite" or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self) -> None:
+        """
+        Stop the periodic maintenance task.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> MaintenanceStats:
+        """
+        Run one maintenance pass in a worker thread.
+
+        Returns:
+            Statistics of the run, also kept as ``last_stats``
+        """
+        stats = await asyncio.to_thread(self._run, asyncio.get_running_loop())
+        self.last_stats = stats
+        logger.info(
+            "SQLite maintenance finished in %.1f ms: freelist %d -> %d pages, "
+            "WAL checkpointed %d of %d pages, skipped %s",
+            stats.duration_ms,
+            stats.freelist_pages_before,
+            stats.freelist_pages_after,
+            stats.wal_pages_checkpointed,
+            stats.wal_pages,
+            stats.skipped or "nothing",
+        )
+        return stats
+
+    async def _run_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.is_idle():
+                continue
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("SQLite maintenance run failed")
+
+    def _run(self, loop: asyncio.AbstractEventLoop) -> MaintenanceStats:
+        with self._exclusive() as acquired:
+            if not acquired:
+                stats = MaintenanceStats(started_at=datetime.now(timezone.utc))
+                stats.skipped.append("locked")
+                return stats
+            return self._run_steps(loop)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[bool]:
+        if self.state_path is None or fcntl is None:
+            yield True
+            return
+        with open(self.state_path, "a") as state_file:
+            try:
+                fcntl.flock(state_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+    def _run_steps(self, loop: asyncio.AbstractEventLoop) -> MaintenanceStats:
+        stats = MaintenanceStats(started_at=datetime.now(timezone.utc))
+        started = time.monotonic()
+        deadline = started + self.time_budget
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            self._incremental_vacuum(cursor, stats, deadline)
+            if time.monotonic() < deadline:
+                # analysis_limit bounds how many rows ANALYZE samples per index
+                cursor.execute("PRAGMA analysis_limit=400")
+                cursor.execute("PRAGMA optimize")
+                stats.optimized = True
+            else:
+                stats.skipped.append("optimize")
+            if time.monotonic() < deadline:
+                # PASSIVE never waits on readers or writers
+                _busy, wal_pages, checkpointed = cursor.execute(
+                    "PRAGMA wal_checkpoint(PASSIVE)"
+                ).fetchone()
+                stats.wal_pages = max(wal_pages, 0)
+                stats.wal_pages_checkpointed = max(checkpointed, 0)
+            else:
+                stats.skipped.append("wal_checkpoint")
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+        self._reconcile_stats(stats, deadline, loop)
+        self._archive_stale(stats, deadline)
+        stats.duration_ms = (time.monotonic() - started) * 1000
+        return stats
+
+    def _reconcile_stats(
+        self,
+        stats: MaintenanceStats,
+        deadline: float,
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        now = time.monotonic()
+        if (
+            self._last_reconciled is not None
+            and now - self._last_reconciled < self.reconcile_interval
+        ):
+            return
+        if now >= deadline:
+            stats.skipped.append("reconcile_stats")
+            return
+        with Session(self.engine) as db:
+            max_id = ConversationRepository(db).get_max_id() or 0
+
+        corrected = 0
+        while self._reconcile_from <= max_id:
+            if time.monotonic() >= deadline:
+                stats.skipped.append("reconcile_stats")
+                break
+            start_id = self._reconcile_from
+            end_id = start_id + self.reconcile_batch_size
+            # One transaction per batch keeps each write lock hold short
+            corrected += self._write(
+                loop,
+                lambda db: ConversationRepository(db).reconcile_stats(
+                    start_id, end_id
+                ),
+            )
+            self._reconcile_from = end_id
+        else:
+            self._reconcile_from = 0
+            self._last_reconciled = time.monotonic()
+        stats.conversations_reconciled = corrected
+        if corrected:
+            logger.warning("Corrected message stats of %d conversations", corrected)
+
+    def _write(
+        self, loop: asyncio.AbstractEventLoop, operation: WriteOperation
+    ) -> Any:
+        # Runs in the maintenance thread, so the write is handed to the
+        # scheduler on the event loop and the thread waits for its commit
+        if self.write_scheduler is None or not self.write_scheduler.running:
+            with Session(self.engine) as db:
+                return operation(db)
+        return asyncio.run_coroutine_threadsafe(
+            self.write_scheduler.submit(operation), loop
+        ).result()
+
+    def _archive_stale(self, stats: MaintenanceStats, deadline: float) -> None:
+        if self.archive_service is None:
+            return
+        if time.monotonic() >= deadline:
+            stats.skipped.append("archive")
+            return
+        if not self.archive_service.ids_are_never_reused():
+            stats.skipped.append("archive")
+            return
+        stale = self.archive_service.stale_conversations(
+            limit=self.archive_batch_size
+        )
+        # One conversation per transaction, so the write lock is released
+        # between them and the time budget is checked before each
+        for conversation_id, shard_name in stale:
+            if time.monotonic() >= deadline:
+                stats.skipped.append("archive")
+                break
+            self.archive_service.archive([conversation_id], shard_name)
+            stats.conversations_archived += 1
+
+    def _incremental_vacuum(
+        self, cursor, stats: MaintenanceStats, deadline: float
+    ) -> None:
+        stats.freelist_pages_before = cursor.execute(
+            "PRAGMA freelist_count"
+        ).fetchone()[0]
+        stats.freelist_pages_after = stats.freelist_pages_before
+        auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != _AUTO_VACUUM_INCREMENTAL:
+            # Converting an existing file needs a full VACUUM, which would
+            # block writers for far longer than the time budget allows.
+            stats.skipped.append("incremental_vacuum")
+            return
+
+        while stats.freelist_pages_after > 0 and time.monotonic() < deadline:
+            # Pages are released while the statement is stepped, so the
+            # result has to be consumed.
+            cursor.execute(
+                f"PRAGMA incremental_vacuum({int(self.vacuum_step_pages)})"
+            ).fetchall()
+            stats.freelist_pages_after = cursor.execute(
+                "PRAGMA freelist_count"
+            ).fetchone()[0]
+
+
+class ActivityMiddleware:
+    """
+    ASGI middleware reporting HTTP and WebSocket traffic to maintenance.
+
+    HTTP requests count as in flight until they finish. A WebSocket session
+    can stay open while nothing happens, so only its messages in either
+    direction count as activity; a streaming reply keeps the worker busy.
+
+    Args:
+        app: Wrapped ASGI application
+        get_service: Returns the maintenance service to notify
+    """
+
+    def __init__(self, app, get_service: Callable[[], MaintenanceService]):
+        self.app = app
+        self.get_service = get_service
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http":
+            service = self.get_service()
+            service.request_started()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                service.request_finished()
+        elif scope["type"] == "websocket":
+            service = self.get_service()
+
+            async def tracked_receive():
+                message = await receive()
+                service.touch()
+                return message
+
+            async def tracked_send(message) -> None:
+                service.touch()
+                await send(message)
+
+            await self.app(scope, tracked_receive, tracked_send)
+        else:
+            await self.app(scope, receive, send)
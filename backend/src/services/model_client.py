@@ -0,0 +1,273 @@
+"""
+Shared, rate-limited HTTP client for the Gemini model API.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from enum import IntEnum
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE_URL = os.getenv(
+    "GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com"
+)
+
+# Upstream responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class Priority(IntEnum):
+    """
+    Request lanes; lower values are served first when tokens are scarce.
+    """
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter with priority lanes.
+
+    Waiters are queued by (priority, arrival order), so a burst of background
+    summary jobs never delays an interactive chat request that arrives later.
+
+    Args:
+        rate: Tokens added per second
+        capacity: Maximum burst size
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._waiters: list = []
+        self._counter = itertools.count()
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        """
+        Wait until a token is available for this request's lane.
+
+        Args:
+            priority: Lane of the request
+        """
+        entry = (int(priority), next(self._counter))
+        async with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    is_next = self._waiters[0] == entry
+                    if is_next and self._tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        self._condition.notify_all()
+                        return
+                    # Only the head of the queue sleeps on the refill timer.
+                    timeout = (1 - self._tokens) / self.rate if is_next else None
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+                raise
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+class ModelClient:
+    """
+    Async client shared by every caller of the model API.
+
+    One pooled HTTP/2 connection set is reused for chat, summaries and file
+    uploads. Each endpoint has its own token bucket, failed requests are
+    retried with full-jitter exponential backoff, and identical requests
+    already in flight share a single upstream call.
+
+    Args:
+        base_url: API base URL
+        api_key: API key sent in the ``x-goog-api-key`` header
+        rate_limits: Per-endpoint ``(rate, capacity)`` overrides
+        default_rate_limit: ``(rate, capacity)`` for other endpoints
+        max_connections: Size of the connection pool
+        max_retries: Retries after the first attempt
+        backoff_base: Backoff in seconds before the first retry
+        backoff_max: Upper bound of a single backoff
+        timeout: Request timeout in seconds
+        http2: Whether to negotiate HTTP/2
+        transport: Transport override, e.g. a local mock server
+    """
+
+    def __init__(
+        self,
+        base_url: str = GEMINI_API_BASE_URL,
+        api_key: Optional[str] = None,
+        rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        default_rate_limit: Tuple[float, int] = (5.0, 10),
+        max_connections: int = 20,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        timeout: float = 60.0,
+        http2: bool = True,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        api_key = api_key if api_key is not None else os.getenv("GEMINI_API_KEY")
+        headers = {"x-goog-api-key": api_key} if api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+            transport=transport,
+        )
+        self.rate_limits = dict(rate_limits or {})
+        self.default_rate_limit = default_rate_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    async def close(self) -> None:
+        """
+        Close the pooled connections.
+        """
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "ModelClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        endpoint: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        coalesce: bool = True,
+        json_body: Any = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Send a request through the rate limiter, retrying transient failures.
+
+        Args:
+            method: HTTP method
+            path: Path relative to the base URL
+            endpoint: Rate-limit bucket name, defaults to the path
+            priority: Lane of the request
+            coalesce: Share the response of an identical request in flight
+            json_body: JSON payload
+            **kwargs: Extra arguments for ``httpx.AsyncClient.request``
+
+        Returns:
+            Successful response with its body read
+
+        Raises:
+            httpx.HTTPStatusError: If the final attempt returns an error status
+            httpx.TransportError: If the final attempt cannot reach the server
+        """
+        if not coalesce or kwargs:
+            # Uploads and custom requests are never shared between callers.
+            return await self._send(
+                method, path, endpoint, priority, json_body, kwargs
+            )
+
+        request_key = (method.upper(), path, json.dumps(json_body, sort_keys=True))
+        # Joining a call queued in a slower lane would make this caller wait
+        # behind that lane, so only calls in the same or a faster lane are
+        # shared.
+        for lane in Priority:
+            if lane > priority:
+                break
+            shared = self._in_flight.get((lane, *request_key))
+            if shared is not None:
+                return await asyncio.shield(shared)
+
+        key = (priority, *request_key)
+
+        shared = asyncio.ensure_future(
+            self._send(method, path, endpoint, priority, json_body, kwargs)
+        )
+        self._in_flight[key] = shared
+        shared.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(shared)
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        endpoint: Optional[str],
+        priority: Priority,
+        json_body: Any,
+        kwargs: Dict[str, Any],
+    ) -> httpx.Response:
+        bucket = self._bucket(endpoint or path)
+        attempt = 0
+        while True:
+            await bucket.acquire(priority)
+            try:
+                response = await self._client.request(
+                    method, path, json=json_body, **kwargs
+                )
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+            else:
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                delay = self._backoff(attempt, response)
+
+            logger.warning(
+                "Retrying %s %s in %.2fs (attempt %d)", method, path, delay, attempt + 1
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _bucket(self, endpoint: str) -> TokenBucket:
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            rate, capacity = self.rate_limits.get(endpoint, self.default_rate_limit)
+            bucket = self._buckets[endpoint] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        # Full jitter keeps retries from many callers from synchronizing.
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        )
@@ -0,0 +1,377 @@
+"""
+Startup fast path: schema check, connection pre-opening and cache warm-up.
+"""
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from sqlalchemy import Column, MetaData, Table, literal
+from sqlalchemy.engine import Connection, Dialect, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from ..database import Base
+from ..models.message import Message, backfill_token_counts
+from ..repositories.conversation_repository import ConversationRepository
+from ..repositories.message_repository import MessageRepository
+from ..tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARM_CONVERSATIONS = int(os.getenv("STARTUP_WARM_CONVERSATIONS", "20"))
+
+_TOKEN_COLUMNS = {"token_count", "path_token_count"}
+
+
+def schema_fingerprint(metadata: MetaData, dialect: Dialect) -> int:
+    """
+    Hash the DDL of a schema into a value that fits ``PRAGMA user_version``.
+
+    Args:
+        metadata: Metadata holding the tables
+        dialect: Dialect the DDL is compiled for
+
+    Returns:
+        Positive 31-bit fingerprint of the tables and indexes
+    """
+    statements = []
+    for table in metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+    digest = hashlib.sha256("\n".join(statements).encode()).digest()
+    # 0 is the user_version of a database that was never stamped
+    return int.from_bytes(digest[:4], "big") & 0x7FFFFFFF or 1
+
+
+def _normalize_ddl(sql: str) -> str:
+    # SQLite keeps CREATE statements as written, except that renaming a
+    # table quotes its name
+    return " ".join(sql.replace('"', "").split())
+
+
+def _default_sql(column: Column, dialect: Dialect) -> Optional[str]:
+    """
+    Get a SQL literal filling a column that existing rows do not have yet.
+
+    Args:
+        column: Model column
+        dialect: Dialect the literal is compiled for
+
+    Returns:
+        Literal of the column's scalar Python default, None when the
+        database default or NULL applies
+    """
+    default = column.default
+    if column.server_default is not None or default is None or not default.is_scalar:
+        return None
+    return str(
+        literal(default.arg).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+@dataclass
+class StartupReport:
+    """
+    Timing breakdown of one application startup.
+
+    Attributes:
+        started_at: Start timestamp
+        phases: Milliseconds spent per phase, in execution order
+        total_ms: Sum of the phase timings
+        schema_created: Whether the schema DDL ran
+        pooled_connections: Connections opened ahead of the first request
+        warmed_conversations: Recent conversations read into the caches
+        warmed_messages: Messages read while warming
+    """
+    started_at: datetime
+    phases: Dict[str, float] = field(default_factory=dict)
+    total_ms: float = 0.0
+    schema_created: bool = False
+    pooled_connections: int = 0
+    warmed_conversations: int = 0
+    warmed_messages: int = 0
+
+
+class StartupService:
+    """
+    Prepares the database before the first request and times each step.
+
+    The schema DDL only runs when the fingerprint stored in SQLite's
+    ``user_version`` differs from the models, so a normal restart does no
+    schema reflection. Pool connections are opened up front so their
+    per-connection pragmas run before traffic arrives, and the queries behind
+    the conversation list and chat history are run for the most recent
+    conversations. That pulls their pages into the SQLite and OS page caches
+    and fills SQLAlchemy's compiled statement cache.
+
+    Args:
+        engine: Engine bound to the application database
+        session_factory: Factory for read sessions
+        warm_conversations: Number of recent conversations to warm
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        session_factory: Callable[[], Session],
+        warm_conversations: int = STARTUP_WARM_CONVERSATIONS,
+    ):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.warm_conversations = warm_conversations
+        self.report = StartupReport(started_at=datetime.now(timezone.utc))
+        self.finished: Optional[StartupReport] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a block of startup work as a named phase.
+
+        Args:
+            name: Phase name in the report
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.perf_counter() - started)
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """
+        Add a phase measured elsewhere, such as module imports.
+
+        Args:
+            name: Phase name in the report
+            seconds: Duration of the phase
+        """
+        self.report.phases[name] = round(seconds * 1000, 2)
+
+    def ensure_schema(self) -> bool:
+        """
+        Bring the schema up to the models unless the stored fingerprint matches.
+
+        On SQLite the upgrade runs in one ``BEGIN IMMEDIATE`` transaction, so
+        workers starting together upgrade one after another and the later
+        ones find the schema already current. Missing tables are created, and
+        a table whose stored DDL differs from the models, such as one missing
+        columns or AUTOINCREMENT, is rebuilt with SQLite's create, copy, drop
+        and rename procedure, since ``ALTER TABLE`` can only add columns.
+        The fingerprint is stored only when every table and index matches
+        the models, so an incomplete upgrade runs again on the next start.
+
+        Returns:
+            Whether the DDL ran
+        """
+        if self.engine.dialect.name != "sqlite":
+            Base.metadata.create_all(bind=self.engine)
+            self.report.schema_created = True
+            return True
+
+        fingerprint = schema_fingerprint(Base.metadata, self.engine.dialect)
+        with self.engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() == fingerprint:
+                return False
+
+        with self.engine.connect() as conn:
+            # Transactions are issued by hand to take the write lock up front
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            # Rebuilding drops tables that others still reference
+            foreign_keys = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                stored = conn.exec_driver_sql("PRAGMA user_version").scalar()
+                if stored == fingerprint:
+                    conn.exec_driver_sql("ROLLBACK")
+                    return False
+                added = self._upgrade_tables(conn)
+                if added.get(Message.__tablename__, set()) & _TOKEN_COLUMNS:
+                    # Copied rows hold the column default instead of a count
+                    recounted = backfill_token_counts(conn)
+                    logger.warning("Backfilled token counts of %d messages", recounted)
+                mismatched = self._mismatched_tables(conn)
+                if mismatched:
+                    logger.error(
+                        "Tables %s still differ from the models; not storing "
+                        "the schema fingerprint",
+                        ", ".join(mismatched),
+                    )
+                else:
+                    conn.exec_driver_sql(f"PRAGMA user_version={int(fingerprint)}")
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            finally:
+                conn.exec_driver_sql(f"PRAGMA foreign_keys={int(foreign_keys)}")
+        self.report.schema_created = True
+        return True
+
+    def _stored_ddl(self, conn: Connection, object_type: str) -> Dict[str, str]:
+        rows = conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = ?", (object_type,)
+        ).all()
+        return {name: sql or "" for name, sql in rows}
+
+    def _upgrade_tables(self, conn: Connection) -> Dict[str, Set[str]]:
+        stored = self._stored_ddl(conn, "table")
+        added = {}
+        for table in Base.metadata.sorted_tables:
+            ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+            if table.name not in stored:
+                conn.exec_driver_sql(ddl)
+            elif _normalize_ddl(stored[table.name]) != _normalize_ddl(ddl):
+                added[table.name] = self._rebuild_table(conn, table, ddl)
+            for index in table.indexes:
+                conn.exec_driver_sql(
+                    str(
+                        CreateIndex(index, if_not_exists=True).compile(
+                            dialect=conn.dialect
+                        )
+                    )
+                )
+        return added
+
+    def _rebuild_table(self, conn: Connection, table: Table, ddl: str) -> Set[str]:
+        preparer = conn.dialect.identifier_preparer
+        name = preparer.format_table(table)
+        staging = preparer.quote(f"_new_{table.name}")
+        present = {
+            row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({name})")
+        }
+        # Keep the AUTOINCREMENT high-water mark, which is above the largest
+        # remaining ID when the newest rows were archived or deleted
+        sequence = None
+        if "sqlite_sequence" in self._stored_ddl(conn, "table"):
+            sequence = conn.exec_driver_sql(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)
+            ).scalar()
+
+        columns, values = [], []
+        for column in table.columns:
+            value = (
+                preparer.quote(column.name)
+                if column.name in present
+                else _default_sql(column, conn.dialect)
+            )
+            # Left out, a column gets its database default or NULL
+            if value is not None:
+                columns.append(preparer.quote(column.name))
+                values.append(value)
+        conn.exec_driver_sql(
+            _normalize_ddl(ddl).replace(
+                f"CREATE TABLE {name} (", f"CREATE TABLE {staging} (", 1
+            )
+        )
+        conn.exec_driver_sql(
+            f"INSERT INTO {staging} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} FROM {name}"
+        )
+        conn.exec_driver_sql(f"DROP TABLE {name}")
+        conn.exec_driver_sql(f"ALTER TABLE {staging} RENAME TO {name}")
+        if sequence:
+            conn.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                (sequence, table.name),
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table.name, sequence, table.name),
+            )
+        logger.warning("Rebuilt table %s to match the models", table.name)
+        return {column.name for column in table.columns} - present
+
+    def _mismatched_tables(self, conn: Connection) -> List[str]:
+        tables = self._stored_ddl(conn, "table")
+        indexes = self._stored_ddl(conn, "index")
+        mismatched = []
+        for table in Base.metadata.sorted_tables:
+            ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+            if _normalize_ddl(tables.get(table.name, "")) != _normalize_ddl(ddl) or any(
+                index.name not in indexes for index in table.indexes
+            ):
+                mismatched.append(table.name)
+        return mismatched
+
+    def prewarm_pool(self) -> int:
+        """
+        Open the pool's steady-state connections and return them to the pool.
+
+        Returns:
+            Number of connections opened
+        """
+        size = getattr(self.engine.pool, "size", None)
+        count = size() if callable(size) else 1
+        connections = []
+        try:
+            for _ in range(count):
+                conn = self.engine.connect()
+                connections.append(conn)
+                conn.exec_driver_sql("SELECT 1")
+        finally:
+            for conn in connections:
+                conn.close()
+        self.report.pooled_connections = len(connections)
+        return len(connections)
+
+    def warm_recent_conversations(self) -> int:
+        """
+        Read the most recent conversations through the request code paths.
+
+        Returns:
+            Number of conversations warmed
+        """
+        # Builds the tokenizer before the first message insert needs it
+        count_tokens("")
+        if self.warm_conversations <= 0:
+            return 0
+
+        warmed = 0
+        warmed_messages = 0
+        with self.session_factory() as db:
+            message_repo = MessageRepository(db)
+            recent = ConversationRepository(db).get_recent(self.warm_conversations)
+            for conversation in recent:
+                if conversation.is_archived:
+                    continue
+                messages = message_repo.get_by_conversation(conversation.id)
+                if messages:
+                    latest = max(messages, key=lambda m: (m.created_at, m.id))
+                    message_repo.get_conversation_thread(latest.id)
+                warmed += 1
+                warmed_messages += len(messages)
+                # Only the pages matter; keep the identity map small
+                db.expunge_all()
+        self.report.warmed_conversations = warmed
+        self.report.warmed_messages = warmed_messages
+        return warmed
+
+    def finish(self) -> StartupReport:
+        """
+        Close the report and log the breakdown.
+
+        Returns:
+            Finished startup report
+        """
+        report = self.report
+        report.total_ms = round(sum(report.phases.values()), 2)
+        self.finished = report
+        logger.info(
+            "Startup finished in %.1f ms (%s); schema DDL %s, %d pooled "
+            "connections, %d conversations warmed",
+            report.total_ms,
+            ", ".join(f"{name} {ms:.1f} ms" for name, ms in report.phases.items()),
+            "ran" if report.schema_created else "skipped",
+            report.pooled_connections,
+            report.warmed_conversations,
+        )
+        return report
@@ -0,0 +1,239 @@
+"""
+Single-writer scheduler that coalesces repository writes into batched transactions.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple, Type
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..database import configure_sqlite_connection
+from ..repositories.base import BATCHED_WRITES_KEY, BaseRepository
+
+logger = logging.getLogger(__name__)
+
+WriteOperation = Callable[[Session], Any]
+
+
+def create_writer_engine(database_url: str) -> Engine:
+    """
+    Create the dedicated engine used by the write scheduler.
+
+    The writer keeps a single connection and, on SQLite, starts every
+    transaction with ``BEGIN IMMEDIATE`` so that writers in other worker
+    processes queue on the busy timeout instead of failing with
+    "database is locked" when a deferred transaction tries to upgrade.
+
+    Args:
+        database_url: SQLAlchemy database URL
+
+    Returns:
+        Engine reserved for batched writes
+    """
+    if "sqlite" not in database_url:
+        return create_engine(database_url, pool_size=1, max_overflow=0)
+
+    engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+    )
+    event.listen(engine, "connect", configure_sqlite_connection)
+
+    @event.listens_for(engine, "connect")
+    def _disable_implicit_begin(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself instead of pysqlite's deferred one.
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+@dataclass
+class _PendingWrite:
+    operation: WriteOperation
+    future: asyncio.Future
+
+
+class WriteScheduler:
+    """
+    Funnels all writes of a process through one writer task.
+
+    Pending writes are collected for one tick and committed together in a
+    single transaction. Each write runs inside its own savepoint, so a failing
+    write is rolled back and reported to its caller without affecting the rest
+    of the batch. Reads keep using the regular session factory.
+
+    Args:
+        engine: Engine created by ``create_writer_engine``
+        tick_interval: Seconds to wait for more writes before committing
+        max_batch_size: Maximum number of writes committed per transaction
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        tick_interval: float = 0.005,
+        max_batch_size: int = 100,
+    ):
+        self.engine = engine
+        self.tick_interval = tick_interval
+        self.max_batch_size = max_batch_size
+        self.session_factory = sessionmaker(
+            bind=engine, autoflush=False, expire_on_commit=False
+        )
+        self.batches_committed = 0
+        self.writes_committed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # One thread keeps the writer connection on a single OS thread.
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the writer task is accepting writes."""
+        return (
+            self._task is not None and not self._task.done() and not self._stopping
+        )
+
+    async def start(self) -> None:
+        """
+        Start the writer task on the running event loop.
+        """
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="write-scheduler"
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Commit every write submitted so far and stop the writer task.
+        """
+        if not self.running:
+            return
+        # Refuse new writes before the sentinel so none can queue behind it
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._stopping = False
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def submit(self, operation: WriteOperation) -> Any:
+        """
+        Queue a write and wait until its batch is committed.
+
+        Args:
+            operation: Callable receiving the batch session; its return value
+                is passed back to the caller once the batch is committed
+
+        Returns:
+            Result of the operation
+
+        Raises:
+            RuntimeError: If the scheduler is not running
+            Exception: Whatever the operation or the batch commit raised
+        """
+        if not self.running:
+            raise RuntimeError("Write scheduler is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingWrite(operation, future))
+        return await future
+
+    async def create(
+        self, repository_class: Type[BaseRepository], obj_in: dict
+    ) -> int:
+        """
+        Create a record through a repository and return its assigned ID.
+
+        Args:
+            repository_class: Repository class taking a session
+            obj_in: Dictionary with object data
+
+        Returns:
+            ID of the created record
+        """
+        return await self.submit(
+            lambda session: repository_class(session).create(obj_in).id
+        )
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            if self.tick_interval:
+                await asyncio.sleep(self.tick_interval)
+
+            batch = [first]
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                pending = self._queue.get_nowait()
+                if pending is None:
+                    stopping = True
+                    break
+                batch.append(pending)
+
+            loop = asyncio.get_running_loop()
+            outcomes = await loop.run_in_executor(
+                self._executor, self._commit_batch, [p.operation for p in batch]
+            )
+            for pending, (succeeded, value) in zip(batch, outcomes):
+                if pending.future.done():
+                    continue
+                if succeeded:
+                    pending.future.set_result(value)
+                else:
+                    pending.future.set_exception(value)
+
+        self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if pending is not None and not pending.future.done():
+                pending.future.set_exception(
+                    RuntimeError("Write scheduler stopped before the write ran")
+                )
+
+    def _commit_batch(
+        self, operations: List[WriteOperation]
+    ) -> List[Tuple[bool, Any]]:
+        session = self.session_factory()
+        session.info[BATCHED_WRITES_KEY] = True
+        outcomes: List[Tuple[bool, Any]] = []
+        try:
+            with session.begin():
+                for operation in operations:
+                    try:
+                        with session.begin_nested():
+                            outcomes.append((True, operation(session)))
+                    except Exception as e:
+                        outcomes.append((False, e))
+        except Exception as e:
+            logger.exception("Write batch of %d operations failed", len(operations))
+            return [(False, e)] * len(operations)
+        finally:
+            session.close()
+
+        committed = sum(1 for succeeded, _ in outcomes if succeeded)
+        self.batches_committed += 1
+        self.writes_committed += committed
+        logger.debug(
+            "Committed write batch: %d of %d operations", committed, len(operations)
+        )
+        return outcomes
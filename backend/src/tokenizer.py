@@ -0,0 +1,82 @@
+"""
+Pluggable local tokenizer used to cache message token counts.
+"""
+import re
+from typing import Protocol
+
+
+class Tokenizer(Protocol):
+    """
+    Interface for counting tokens without calling the model API.
+    """
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a text.
+
+        Args:
+            text: Text to count
+
+        Returns:
+            Number of tokens
+        """
+        ...
+
+
+class RegexTokenizer:
+    """
+    Approximate tokenizer counting words and punctuation marks.
+
+    Each run of word characters and each other non-space character counts as
+    one token, which is close enough for budgeting and needs no model files.
+    """
+
+    _pattern = re.compile(r"\w+|[^\w\s]")
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a text.
+
+        Args:
+            text: Text to count
+
+        Returns:
+            Number of tokens
+        """
+        return len(self._pattern.findall(text or ""))
+
+
+_tokenizer: Tokenizer = RegexTokenizer()
+
+
+def get_tokenizer() -> Tokenizer:
+    """
+    Get the tokenizer used for new token counts.
+    """
+    return _tokenizer
+
+
+def set_tokenizer(tokenizer: Tokenizer) -> None:
+    """
+    Replace the tokenizer used for new token counts.
+
+    Counts already stored on messages are not recomputed.
+
+    Args:
+        tokenizer: Object implementing ``count(text) -> int``
+    """
+    global _tokenizer
+    _tokenizer = tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with the configured tokenizer.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Number of tokens
+    """
+    return _tokenizer.count(text)
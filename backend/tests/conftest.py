@@ -2,9 +2,21 @@
 Test configuration and fixtures.
 """
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    event,
+)
 from sqlalchemy.orm import sessionmaker
-from src.database import Base
+from src.database import Base, configure_sqlite_connection
 from src.models import Conversation, Message, AttachedFile
 
 
@@ -29,6 +41,86 @@ def test_db():
         engine.dispose()
 
 
+@pytest.fixture
+def empty_file_engine(tmp_path):
+    """
+    Create an engine on a new database file configured like the application
+    database, without any tables.
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'chat.sqlite'}",
+        connect_args={"check_same_thread": False},
+    )
+    event.listen(engine, "connect", configure_sqlite_connection)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def file_engine(empty_file_engine):
+    """
+    Create the schema in a file-based database.
+    
+    Unlike ``test_db``, the file can be shared with other engines, worker
+    processes and attached archive shards.
+    """
+    Base.metadata.create_all(bind=empty_file_engine)
+    return empty_file_engine
+
+
+@pytest.fixture
+def pre_series_engine(empty_file_engine):
+    """
+    Create the tables of the original schema, before the denormalized
+    stats, token counts, archive and upload columns were added.
+    """
+    metadata = MetaData()
+    Table(
+        "conversations",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("title", String, nullable=False),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+    )
+    Table(
+        "messages",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column(
+            "conversation_id",
+            Integer,
+            ForeignKey("conversations.id"),
+            nullable=False,
+        ),
+        Column("parent_message_id", Integer, ForeignKey("messages.id")),
+        Column("role", String, nullable=False),
+        Column("content", Text, nullable=False),
+        Column("node_summary", Text),
+        Column("created_at", DateTime),
+        CheckConstraint("role IN ('user', 'model')", name="check_role"),
+    )
+    Table(
+        "attached_files",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("message_id", Integer, ForeignKey("messages.id"), nullable=False),
+        Column("file_name", String, nullable=False),
+        Column("gemini_file_uri", String, nullable=False),
+        Column("created_at", DateTime),
+    )
+    metadata.create_all(bind=empty_file_engine)
+    return empty_file_engine
+
+
+@pytest.fixture
+def database_url(file_engine):
+    """
+    Get the URL of the file-based database, for code opening its own engines.
+    """
+    return file_engine.url.render_as_string(hide_password=False)
+
+
 @pytest.fixture
 def sample_conversation(test_db):
     """
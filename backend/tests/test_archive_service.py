@@ -0,0 +1,178 @@
+"""
+Tests for the conversation archive service.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src.models import AttachedFile, Conversation, Message
+from src.repositories.conversation_repository import ConversationRepository
+from src.services.archive_service import ArchiveError, ArchiveService
+from src.services.startup_service import StartupService
+
+
+@pytest.fixture
+def archive_db(file_engine):
+    """
+    Create a session on the file-based main database.
+    """
+    db = sessionmaker(bind=file_engine, autoflush=False)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _create_conversation(db, title, age_days):
+    updated_at = datetime.now(timezone.utc) - timedelta(days=age_days)
+    conversation = Conversation(title=title, updated_at=updated_at)
+    db.add(conversation)
+    db.flush()
+    # Adding a message bumps updated_at, so the messages carry the age
+    root = Message(
+        conversation_id=conversation.id,
+        role="user",
+        content="Hello",
+        created_at=updated_at,
+    )
+    db.add(root)
+    db.flush()
+    reply = Message(
+        conversation_id=conversation.id,
+        parent_message_id=root.id,
+        role="model",
+        content="Hi",
+        created_at=updated_at,
+    )
+    db.add(reply)
+    db.flush()
+    db.add(
+        AttachedFile(
+            message_id=root.id, file_name="a.pdf", gemini_file_uri="files/a"
+        )
+    )
+    db.commit()
+    return conversation.id
+
+
+class TestArchiveService:
+    """Test cases for ArchiveService."""
+
+    def test_archive_stale_moves_cold_conversations(
+        self, file_engine, archive_db, tmp_path
+    ):
+        """Test that only conversations past the threshold are archived."""
+        cold_id = _create_conversation(archive_db, "Cold", age_days=200)
+        hot_id = _create_conversation(archive_db, "Hot", age_days=1)
+        service = ArchiveService(file_engine, str(tmp_path / "archive"))
+
+        archived = service.archive_stale(older_than_days=90)
+
+        archive_db.expire_all()
+        assert archived == 1
+        assert archive_db.query(Message).filter_by(conversation_id=cold_id).count() == 0
+        assert archive_db.query(Message).filter_by(conversation_id=hot_id).count() == 2
+        assert archive_db.query(AttachedFile).count() == 1
+        assert archive_db.get(Conversation, cold_id).is_archived
+        assert len(os.listdir(tmp_path / "archive")) == 1
+
+    def test_listing_covers_archived_conversations(
+        self, file_engine, archive_db, tmp_path
+    ):
+        """Test that archived conversations stay in the recent listing."""
+        _create_conversation(archive_db, "Cold", age_days=200)
+        _create_conversation(archive_db, "Hot", age_days=1)
+        ArchiveService(file_engine, str(tmp_path / "archive")).archive_stale(90)
+
+        archive_db.expire_all()
+        recent = ConversationRepository(archive_db).get_recent(limit=10)
+
+        assert [conv.title for conv in recent] == ["Hot", "Cold"]
+
+    def test_open_conversation_restores_archived_rows(
+        self, file_engine, archive_db, tmp_path
+    ):
+        """Test that reopening an archived conversation restores its rows."""
+        cold_id = _create_conversation(archive_db, "Cold", age_days=200)
+        service = ArchiveService(file_engine, str(tmp_path / "archive"))
+        service.archive_stale(older_than_days=90)
+        archive_db.expire_all()
+
+        conversation = service.open_conversation(archive_db, cold_id)
+
+        assert not conversation.is_archived
+        assert len(conversation.messages) == 2
+        assert sum(len(m.attached_files) for m in conversation.messages) == 1
+        replies = [m for m in conversation.messages if m.parent_message_id]
+        assert replies[0].parent_message_id in {m.id for m in conversation.messages}
+
+    def test_restore_not_archived(self, file_engine, archive_db, tmp_path):
+        """Test that restoring a hot conversation is a no-op."""
+        hot_id = _create_conversation(archive_db, "Hot", age_days=1)
+        service = ArchiveService(file_engine, str(tmp_path / "archive"))
+
+        assert service.restore(hot_id) is False
+
+    def test_restore_message_finds_shard(self, file_engine, archive_db, tmp_path):
+        """Test that a message ID alone is enough to restore its conversation."""
+        cold_id = _create_conversation(archive_db, "Cold", age_days=200)
+        message_id = (
+            archive_db.query(Message.id).filter_by(conversation_id=cold_id).first()[0]
+        )
+        service = ArchiveService(file_engine, str(tmp_path / "archive"))
+        service.archive_stale(older_than_days=90)
+
+        assert service.restore_message(message_id) is True
+        assert service.restore_message(message_id) is False
+        archive_db.expire_all()
+        assert not archive_db.get(Conversation, cold_id).is_archived
+
+    def test_archive_stale_limit_takes_oldest(
+        self, file_engine, archive_db, tmp_path
+    ):
+        """Test that a limited run archives the oldest conversations first."""
+        oldest_id = _create_conversation(archive_db, "Oldest", age_days=300)
+        _create_conversation(archive_db, "Old", age_days=200)
+        service = ArchiveService(file_engine, str(tmp_path / "archive"))
+
+        assert service.archive_stale(older_than_days=90, limit=1) == 1
+
+        archive_db.expire_all()
+        archived = archive_db.query(Conversation).filter(
+            Conversation.archive_shard.is_not(None)
+        )
+        assert [c.id for c in archived] == [oldest_id]
+
+    def test_pre_series_schema_archives_after_upgrade(
+        self, pre_series_engine, tmp_path
+    ):
+        """Test that archived IDs are not reused on an upgraded old database."""
+        with pre_series_engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO conversations (title, updated_at) "
+                "VALUES ('Old', '2024-01-01 00:00:00'), ('Other', NULL)"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO messages (conversation_id, role, content, created_at) "
+                "VALUES (1, 'user', 'Hello', '2024-01-01 00:00:00')"
+            )
+        service = ArchiveService(pre_series_engine, str(tmp_path / "archive"))
+        # Before the upgrade the tables lack AUTOINCREMENT
+        assert not service.ids_are_never_reused()
+        with pytest.raises(ArchiveError):
+            service.archive([1], "conversations_2024_01.sqlite")
+
+        session_factory = sessionmaker(bind=pre_series_engine)
+        StartupService(pre_series_engine, session_factory).ensure_schema()
+        assert service.archive_stale(older_than_days=90) == 1
+        with session_factory() as db:
+            message = Message(conversation_id=2, role="user", content="New")
+            db.add(message)
+            db.commit()
+            assert message.id == 2
+
+        assert service.restore(1)
+        with session_factory() as db:
+            assert db.query(Message).count() == 2
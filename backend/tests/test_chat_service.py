@@ -0,0 +1,248 @@
+"""
+Tests for the chat turn service.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.orm import sessionmaker
+
+from src.models import AttachedFile, Conversation, Message
+from src.services.archive_service import ArchiveService
+from src.services.chat_service import ChatError, ChatService
+from src.services.file_storage import FileStorage
+from src.services.write_scheduler import WriteScheduler, create_writer_engine
+
+
+class EchoModel:
+    """Model stand-in that replies with the last user message in two chunks."""
+
+    def __init__(self):
+        self.histories = []
+
+    async def stream(self, history):
+        self.histories.append(history)
+        yield "echo: "
+        yield history[-1]["content"]
+
+
+@pytest_asyncio.fixture
+async def scheduler(database_url):
+    """
+    Run a write scheduler on the test database.
+    """
+    scheduler = WriteScheduler(create_writer_engine(database_url))
+    await scheduler.start()
+    yield scheduler
+    await scheduler.stop()
+    scheduler.engine.dispose()
+
+
+def _create_conversation(engine, age_days=0):
+    created_at = datetime.now(timezone.utc) - timedelta(days=age_days)
+    with sessionmaker(bind=engine)() as db:
+        conversation = Conversation(title="Chat", updated_at=created_at)
+        db.add(conversation)
+        db.flush()
+        root = Message(
+            conversation_id=conversation.id,
+            role="user",
+            content="Hello",
+            created_at=created_at,
+        )
+        db.add(root)
+        db.flush()
+        reply = Message(
+            conversation_id=conversation.id,
+            parent_message_id=root.id,
+            role="model",
+            content="Hi",
+            created_at=created_at,
+        )
+        db.add(reply)
+        db.commit()
+        return conversation.id, root.id, reply.id
+
+
+async def _turn(service, conversation_id, payload):
+    return [event async for event in service.stream_turn(conversation_id, payload)]
+
+
+class TestChatService:
+    """Test cases for ChatService."""
+
+    @pytest.mark.asyncio
+    async def test_turn_on_archived_conversation(
+        self, file_engine, scheduler, tmp_path
+    ):
+        """Test that chatting on an archived conversation restores its branch."""
+        conversation_id, root_id, reply_id = _create_conversation(
+            file_engine, age_days=200
+        )
+        archive_service = ArchiveService(file_engine, str(tmp_path / "archive"))
+        assert archive_service.archive_stale(older_than_days=90) == 1
+        service = ChatService(
+            sessionmaker(bind=file_engine),
+            scheduler,
+            EchoModel(),
+            archive_service=archive_service,
+        )
+
+        events = await _turn(
+            service, conversation_id, {"type": "chat_message", "content": "Again"}
+        )
+        forked = await _turn(
+            service,
+            conversation_id,
+            {"type": "chat_message", "content": "Fork", "parent_message_id": root_id},
+        )
+
+        assert events[-1]["message"]["content"] == "echo: Again"
+        assert forked[-1]["type"] == "stream_end"
+        with sessionmaker(bind=file_engine)() as db:
+            assert not db.get(Conversation, conversation_id).is_archived
+            user_message = db.get(Message, events[-1]["message"]["parent_message_id"])
+            assert user_message.parent_message_id == reply_id
+            messages = db.query(Message).filter_by(conversation_id=conversation_id)
+            assert messages.count() == 6
+
+    @pytest.mark.asyncio
+    async def test_stored_upload_is_linked(self, file_engine, scheduler, tmp_path):
+        """Test that an uploaded file referenced in a turn is recorded."""
+        conversation_id, _, _ = _create_conversation(file_engine)
+        storage = FileStorage(str(tmp_path / "uploaded_files"))
+
+        async def upload():
+            yield b"%PDF-1.7\n" + b"x" * 100
+
+        stored = await storage.save(upload())
+        service = ChatService(
+            sessionmaker(bind=file_engine), scheduler, EchoModel(), file_storage=storage
+        )
+        attached = {
+            "file_name": "report.pdf",
+            "gemini_file_uri": "files/report",
+            "storage_path": stored.storage_path,
+            "mime_type": "text/html",
+        }
+
+        await _turn(service, conversation_id, {
+            "type": "chat_message", "content": "Read this", "files": [attached]
+        })
+        with pytest.raises(ChatError):
+            await _turn(service, conversation_id, {
+                "type": "chat_message",
+                "content": "And this",
+                "files": [{**attached, "storage_path": "../../etc/passwd"}],
+            })
+
+        with sessionmaker(bind=file_engine)() as db:
+            (attached_file,) = db.query(AttachedFile).all()
+            assert attached_file.storage_path == stored.storage_path
+            assert attached_file.content_hash == stored.content_hash
+            assert attached_file.mime_type == "application/pdf"
+            assert attached_file.size_bytes == stored.size_bytes
+
+    @pytest.mark.asyncio
+    async def test_turn_continues_latest_branch(self, file_engine, scheduler):
+        """Test that a turn without a parent replies to the latest message."""
+        conversation_id, _, reply_id = _create_conversation(file_engine)
+        model = EchoModel()
+        service = ChatService(sessionmaker(bind=file_engine), scheduler, model)
+
+        events = await _turn(
+            service, conversation_id, {"type": "chat_message", "content": "Next"}
+        )
+
+        assert [e["type"] for e in events] == [
+            "stream_chunk", "stream_chunk", "stream_end"
+        ]
+        assert "".join(e["content"] for e in events[:-1]) == "echo: Next"
+        assert [entry["content"] for entry in model.histories[0]] == [
+            "Hello", "Hi", "Next"
+        ]
+        with sessionmaker(bind=file_engine)() as db:
+            reply = db.get(Message, events[-1]["message"]["id"])
+            assert reply.role == "model"
+            assert reply.parent_message.parent_message_id == reply_id
+
+    @pytest.mark.asyncio
+    async def test_fork_from_earlier_message(self, file_engine, scheduler):
+        """Test that a parent_message_id starts a branch without later messages."""
+        conversation_id, root_id, _ = _create_conversation(file_engine)
+        model = EchoModel()
+        service = ChatService(sessionmaker(bind=file_engine), scheduler, model)
+
+        events = await _turn(service, conversation_id, {
+            "type": "chat_message", "content": "Fork", "parent_message_id": root_id
+        })
+
+        assert [entry["content"] for entry in model.histories[0]] == [
+            "Hello", "Fork"
+        ]
+        with sessionmaker(bind=file_engine)() as db:
+            user_message = db.get(Message, events[-1]["message"]["parent_message_id"])
+            assert user_message.parent_message_id == root_id
+            root = db.get(Message, root_id)
+            assert len(root.child_messages) == 2
+
+    @pytest.mark.asyncio
+    async def test_missing_conversation(self, file_engine, scheduler):
+        """Test that a turn on an unknown conversation is rejected."""
+        service = ChatService(sessionmaker(bind=file_engine), scheduler, EchoModel())
+
+        with pytest.raises(ChatError, match="not found"):
+            await _turn(service, 999, {"type": "chat_message", "content": "Hi"})
+
+    @pytest.mark.asyncio
+    async def test_unknown_parent_message(self, file_engine, scheduler):
+        """Test that missing and foreign parent messages are rejected."""
+        conversation_id, _, _ = _create_conversation(file_engine)
+        _, other_root_id, _ = _create_conversation(file_engine)
+        model = EchoModel()
+        service = ChatService(sessionmaker(bind=file_engine), scheduler, model)
+
+        for parent_message_id in (999, other_root_id, "not-an-id"):
+            with pytest.raises(ChatError):
+                await _turn(service, conversation_id, {
+                    "type": "chat_message",
+                    "content": "Hi",
+                    "parent_message_id": parent_message_id,
+                })
+
+        assert model.histories == []
+        with sessionmaker(bind=file_engine)() as db:
+            messages = db.query(Message).filter_by(conversation_id=conversation_id)
+            assert messages.count() == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("payload", [
+        {"type": "ping", "content": "Hi"},
+        {"type": "chat_message"},
+        {"type": "chat_message", "content": 42},
+        {"type": "chat_message", "content": "   "},
+        {"type": "chat_message", "content": "Hi", "files": "report.pdf"},
+        {"type": "chat_message", "content": "Hi", "files": [{"file_name": "a"}]},
+    ])
+    async def test_invalid_payload(self, file_engine, scheduler, payload):
+        """Test that malformed chat_message payloads are rejected."""
+        conversation_id, _, _ = _create_conversation(file_engine)
+        service = ChatService(sessionmaker(bind=file_engine), scheduler, EchoModel())
+
+        with pytest.raises(ChatError):
+            await _turn(service, conversation_id, payload)
+
+    @pytest.mark.asyncio
+    async def test_no_model_configured(self, file_engine, scheduler):
+        """Test that turns fail before writing when no model is configured."""
+        conversation_id, _, _ = _create_conversation(file_engine)
+        service = ChatService(sessionmaker(bind=file_engine), scheduler, None)
+
+        with pytest.raises(ChatError, match="No chat model"):
+            await _turn(
+                service, conversation_id, {"type": "chat_message", "content": "Hi"}
+            )
+
+        with sessionmaker(bind=file_engine)() as db:
+            messages = db.query(Message).filter_by(conversation_id=conversation_id)
+            assert messages.count() == 2
@@ -0,0 +1,203 @@
+"""
+Tests for cached token counts and context window selection.
+"""
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src import tokenizer
+from src.models import Message
+from src.repositories.message_repository import MessageRepository
+from src.services.context_window import ContextWindowService
+from src.services.startup_service import StartupService
+
+
+def _build_branch(test_db, conversation_id, contents, summaries=None):
+    """
+    Create a linear branch of messages and return them root first.
+    """
+    repo = MessageRepository(test_db)
+    summaries = summaries or [None] * len(contents)
+    messages = []
+    parent_id = None
+    for index, (content, summary) in enumerate(zip(contents, summaries)):
+        message = repo.create({
+            "conversation_id": conversation_id,
+            "parent_message_id": parent_id,
+            "role": "user" if index % 2 == 0 else "model",
+            "content": content,
+            "node_summary": summary,
+        })
+        messages.append(message)
+        parent_id = message.id
+    return messages
+
+
+class TestTokenCounts:
+    """Test cases for token counts cached on messages."""
+
+    def test_counts_cached_on_insert(self, test_db, sample_conversation):
+        """Test that token and cumulative counts are stored on insert."""
+        root, reply = _build_branch(
+            test_db, sample_conversation.id, ["one two three", "four five"]
+        )
+
+        assert root.token_count == 3
+        assert root.path_token_count == 3
+        assert reply.token_count == 2
+        assert reply.path_token_count == 5
+
+    def test_forks_have_independent_totals(self, test_db, sample_conversation):
+        """Test that sibling branches accumulate only their own ancestors."""
+        root, _ = _build_branch(test_db, sample_conversation.id, ["a b", "c d e"])
+        fork = MessageRepository(test_db).create({
+            "conversation_id": sample_conversation.id,
+            "parent_message_id": root.id,
+            "role": "model",
+            "content": "f",
+        })
+
+        assert fork.path_token_count == 3
+
+    def test_summary_recounted_on_update(self, test_db, sample_message):
+        """Test that summary tokens are recounted when the summary changes."""
+        MessageRepository(test_db).update(
+            sample_message.id, {"node_summary": "a much longer summary"}
+        )
+
+        assert sample_message.summary_token_count == 4
+
+    def test_content_edit_shifts_subtree_totals(self, test_db, sample_conversation):
+        """Test that editing content updates the message and its descendants."""
+        root, middle, leaf = _build_branch(
+            test_db, sample_conversation.id, ["a b", "c d e", "f"]
+        )
+        repo = MessageRepository(test_db)
+
+        repo.update(middle.id, {"content": "c"})
+        test_db.expire_all()
+
+        assert (root.path_token_count, middle.token_count) == (2, 1)
+        assert middle.path_token_count == 3
+        assert leaf.path_token_count == 4
+
+    def test_reparent_recomputes_subtree_totals(self, test_db, sample_conversation):
+        """Test that moving a message under a new parent updates its subtree."""
+        root, middle, leaf = _build_branch(
+            test_db, sample_conversation.id, ["a b", "c d e", "f"]
+        )
+
+        MessageRepository(test_db).update(middle.id, {"parent_message_id": None})
+        test_db.expire_all()
+
+        assert middle.path_token_count == 3
+        assert leaf.path_token_count == 4
+
+    def test_pluggable_tokenizer(self, test_db, sample_conversation):
+        """Test that a replacement tokenizer is used for new messages."""
+        class CharacterTokenizer:
+            def count(self, text):
+                return len(text)
+
+        original = tokenizer.get_tokenizer()
+        tokenizer.set_tokenizer(CharacterTokenizer())
+        try:
+            (message,) = _build_branch(test_db, sample_conversation.id, ["abcd"])
+        finally:
+            tokenizer.set_tokenizer(original)
+
+        assert message.token_count == 4
+
+
+    def test_counts_backfilled_on_upgrade(self, pre_series_engine):
+        """Test that messages from before token counting get real counts."""
+        contents = ["Hello there", "How can I help?", "Tell me a joke", "Another fork"]
+        with pre_series_engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO conversations (title) VALUES ('Old')")
+            # The last message forks from the root
+            for parent_id, content in zip((None, 1, 2, 1), contents):
+                conn.exec_driver_sql(
+                    "INSERT INTO messages (conversation_id, parent_message_id, "
+                    "role, content, node_summary) VALUES (1, ?, 'user', ?, ?)",
+                    (parent_id, content, "Summary" if parent_id == 2 else None),
+                )
+
+        session_factory = sessionmaker(bind=pre_series_engine)
+        StartupService(pre_series_engine, session_factory).ensure_schema()
+
+        counts = [tokenizer.count_tokens(content) for content in contents]
+        with session_factory() as db:
+            messages = db.query(Message).order_by(Message.id).all()
+            assert [m.token_count for m in messages] == counts
+            assert messages[2].summary_token_count == tokenizer.count_tokens("Summary")
+            service = ContextWindowService(db)
+            assert service.branch_token_count(3) == sum(counts[:3])
+            assert service.branch_token_count(4) == counts[0] + counts[3]
+
+
+class TestContextWindowService:
+    """Test cases for ContextWindowService."""
+
+    def test_whole_branch_fits(self, test_db, sample_conversation):
+        """Test that a branch within budget is returned verbatim."""
+        messages = _build_branch(test_db, sample_conversation.id, ["a b", "c d", "e"])
+        service = ContextWindowService(test_db)
+
+        window = service.build(messages[-1].id, token_budget=10)
+
+        assert service.branch_token_count(messages[-1].id) == 5
+        assert [e.message.id for e in window.entries] == [m.id for m in messages]
+        assert window.token_count == 5
+        assert not window.truncated
+
+    def test_pins_root_and_summarizes_older_turns(self, test_db, sample_conversation):
+        """Test that older turns fall back to summaries behind recent ones."""
+        messages = _build_branch(
+            test_db,
+            sample_conversation.id,
+            ["root", "w w w w w", "x x x x x", "y y y", "leaf"],
+            [None, "old", "mid", None, None],
+        )
+
+        window = ContextWindowService(test_db).build(messages[-1].id, token_budget=8)
+
+        selected = [(e.message.id, e.use_summary) for e in window.entries]
+        assert selected == [
+            (messages[0].id, False),
+            (messages[1].id, True),
+            (messages[2].id, True),
+            (messages[3].id, False),
+            (messages[4].id, False),
+        ]
+        assert window.token_count == 7
+        assert window.truncated
+
+    def test_drops_turns_without_summaries(self, test_db, sample_conversation):
+        """Test that turns that fit neither in full nor summarized are dropped."""
+        messages = _build_branch(
+            test_db, sample_conversation.id, ["root", "x x x x x x", "leaf"]
+        )
+
+        window = ContextWindowService(test_db).build(messages[-1].id, token_budget=3)
+
+        assert [e.message.id for e in window.entries] == [
+            messages[0].id,
+            messages[2].id,
+        ]
+
+    @pytest.mark.parametrize("budget", [0, 1])
+    def test_leaf_always_included(self, test_db, sample_conversation, budget):
+        """Test that the leaf is kept even when it exceeds the budget."""
+        messages = _build_branch(test_db, sample_conversation.id, ["a b c"])
+
+        window = ContextWindowService(test_db).build(messages[0].id, budget)
+
+        assert [e.message for e in window.entries] == [messages[0]]
+
+    def test_thread_order(self, test_db, sample_conversation):
+        """Test that the thread is returned from root to leaf."""
+        messages = _build_branch(test_db, sample_conversation.id, ["a", "b", "c"])
+
+        thread = MessageRepository(test_db).get_conversation_thread(messages[-1].id)
+
+        assert [m.id for m in thread] == [m.id for m in messages]
+        assert isinstance(thread[0], Message)
@@ -0,0 +1,202 @@
+"""
+Tests for chunked local file storage.
+"""
+import hashlib
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.database import get_db
+from src.repositories.file_repository import FileRepository
+from src.services.file_storage import (
+    FileStorage,
+    FileTooLargeError,
+    FileValidationError,
+)
+
+PDF_CONTENT = b"%PDF-1.7\n" + bytes(range(256)) * 64
+
+
+async def _chunks(content, size):
+    for offset in range(0, len(content), size):
+        yield content[offset:offset + size]
+
+
+def _multipart_body(boundary, file_name, content, name="file"):
+    return (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="' + name.encode()
+        + b'"; filename="' + file_name.encode() + b'"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n"
+        + content + b"\r\n--" + boundary + b"--\r\n"
+    )
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """
+    Create a storage with small chunks so tests span many of them.
+    """
+    return FileStorage(str(tmp_path / "uploaded_files"), chunk_size=1000)
+
+
+class TestFileStorage:
+    """Test cases for FileStorage."""
+
+    @pytest.mark.asyncio
+    async def test_save_streams_chunks(self, storage):
+        """Test that chunked content is hashed, typed and written whole."""
+        stored = await storage.save(_chunks(PDF_CONTENT, 7))
+
+        assert stored.mime_type == "application/pdf"
+        assert stored.size_bytes == len(PDF_CONTENT)
+        assert stored.content_hash == hashlib.sha256(PDF_CONTENT).hexdigest()
+        with open(storage.path_for(stored.storage_path), "rb") as saved:
+            assert saved.read() == PDF_CONTENT
+        assert not [n for n in os.listdir(storage.root_dir) if n.endswith(".part")]
+
+    @pytest.mark.asyncio
+    async def test_rejects_unsupported_type(self, storage):
+        """Test that non-PDF, non-image content is rejected and cleaned up."""
+        with pytest.raises(FileValidationError):
+            await storage.save(_chunks(b"#!/bin/sh\necho hi\n" * 10, 5))
+
+        assert os.listdir(storage.root_dir) == []
+
+    @pytest.mark.asyncio
+    async def test_rejects_oversized_upload(self, tmp_path):
+        """Test that uploads over the size limit stop early."""
+        storage = FileStorage(str(tmp_path), max_size=100)
+
+        with pytest.raises(FileTooLargeError):
+            await storage.save(_chunks(PDF_CONTENT, 50))
+
+    @pytest.mark.asyncio
+    async def test_save_multipart_streams_file_field(self, storage):
+        """Test that the file field is parsed from a body split across chunks."""
+        body = _multipart_body(b"BOUNDARY", "doc.pdf", PDF_CONTENT)
+
+        file_name, stored = await storage.save_multipart(
+            "multipart/form-data; boundary=BOUNDARY", _chunks(body, 333)
+        )
+
+        assert file_name == "doc.pdf"
+        assert stored.size_bytes == len(PDF_CONTENT)
+        assert stored.content_hash == hashlib.sha256(PDF_CONTENT).hexdigest()
+
+    @pytest.mark.asyncio
+    async def test_save_multipart_stops_reading_oversized_body(self, tmp_path):
+        """Test that an oversized upload is rejected before the body is read."""
+        storage = FileStorage(str(tmp_path), max_size=100)
+        body = _multipart_body(b"BOUNDARY", "doc.pdf", PDF_CONTENT)
+        read = []
+
+        async def tracked():
+            async for chunk in _chunks(body, 50):
+                read.append(chunk)
+                yield chunk
+
+        with pytest.raises(FileTooLargeError):
+            await storage.save_multipart(
+                "multipart/form-data; boundary=BOUNDARY", tracked()
+            )
+        assert sum(map(len, read)) < len(body) // 10
+        assert os.listdir(storage.root_dir) == []
+
+    @pytest.mark.asyncio
+    async def test_save_multipart_requires_file_field(self, storage):
+        """Test that bodies without the file field or multipart type are rejected."""
+        body = _multipart_body(b"BOUNDARY", "doc.pdf", PDF_CONTENT, name="other")
+
+        with pytest.raises(FileValidationError):
+            await storage.save_multipart(
+                "multipart/form-data; boundary=BOUNDARY", _chunks(body, 1000)
+            )
+        with pytest.raises(FileValidationError):
+            await storage.save_multipart("application/pdf", _chunks(PDF_CONTENT, 1000))
+
+    @pytest.mark.asyncio
+    async def test_iter_range(self, storage):
+        """Test that byte ranges are read in chunk-sized pieces."""
+        stored = await storage.save(_chunks(PDF_CONTENT, 4096))
+
+        pieces = list(storage.iter_range(stored.storage_path, 10, 2510))
+
+        assert b"".join(pieces) == PDF_CONTENT[10:2510]
+        assert max(len(piece) for piece in pieces) <= storage.chunk_size
+
+    @pytest.mark.asyncio
+    async def test_describe_only_accepts_stored_uploads(self, storage, tmp_path):
+        """Test that metadata is read back only for content-addressed files."""
+        stored = await storage.save(_chunks(PDF_CONTENT, 4096))
+
+        assert storage.describe(stored.storage_path) == stored
+        forged = os.path.join(stored.content_hash[:2], "0" * 64 + ".pdf")
+        for storage_path in (forged, "../outside.pdf", stored.content_hash[:2]):
+            with pytest.raises(FileValidationError):
+                storage.describe(storage_path)
+
+    def test_path_for_stays_inside_root(self, storage):
+        """Test that storage paths cannot escape the storage root."""
+        with pytest.raises(FileValidationError):
+            storage.path_for("../../etc/passwd")
+
+
+class TestFileEndpoints:
+    """Test cases for the upload and download endpoints."""
+
+    @pytest.fixture
+    def client(self, test_db, storage):
+        import main
+
+        original = main.file_storage
+        main.file_storage = storage
+        main.app.dependency_overrides[get_db] = lambda: test_db
+        try:
+            yield TestClient(main.app)
+        finally:
+            main.file_storage = original
+            main.app.dependency_overrides.clear()
+
+    def test_upload_and_ranged_download(self, client, test_db, sample_message):
+        """Test that an uploaded file downloads whole and by byte range."""
+        response = client.post(
+            "/api/files",
+            files={"file": ("doc.pdf", PDF_CONTENT, "application/pdf")},
+        )
+        assert response.status_code == 201
+        uploaded = response.json()
+        attached = FileRepository(test_db).create({
+            "message_id": sample_message.id,
+            "file_name": uploaded["file_name"],
+            "gemini_file_uri": "files/doc",
+            "storage_path": uploaded["storage_path"],
+            "content_hash": uploaded["content_hash"],
+            "mime_type": uploaded["mime_type"],
+            "size_bytes": uploaded["size_bytes"],
+        })
+
+        full = client.get(f"/api/files/{attached.id}")
+        partial = client.get(
+            f"/api/files/{attached.id}", headers={"Range": "bytes=100-199"}
+        )
+        invalid = client.get(
+            f"/api/files/{attached.id}", headers={"Range": "bytes=999999-"}
+        )
+
+        assert full.content == PDF_CONTENT
+        assert partial.status_code == 206
+        assert partial.content == PDF_CONTENT[100:200]
+        assert partial.headers["content-range"] == (
+            f"bytes 100-199/{len(PDF_CONTENT)}"
+        )
+        assert invalid.status_code == 416
+
+    def test_upload_rejects_unsupported_type(self, client):
+        """Test that unsupported uploads return 400."""
+        response = client.post(
+            "/api/files", files={"file": ("a.txt", b"plain text" * 3, "text/plain")}
+        )
+
+        assert response.status_code == 400
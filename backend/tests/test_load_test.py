@@ -0,0 +1,98 @@
+"""
+Tests for the WebSocket load-testing harness.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.load_test import (
+    FakeStreamingModel,
+    LoadTestConfig,
+    percentile,
+    run_load_test,
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestLoadTest:
+    """Test cases for the load test harness."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        samples = [float(value) for value in range(1, 101)]
+
+        assert percentile(samples, 50) == 50.0
+        assert percentile(samples, 99) == 99.0
+        assert percentile([], 99) == 0.0
+
+    @pytest.mark.asyncio
+    async def test_fake_model_streams_configured_tokens(self):
+        """Test that the fake model streams the configured reply length."""
+        model = FakeStreamingModel(
+            tokens_per_second=1000, response_tokens=4, first_token_delay=0
+        )
+
+        chunks = [chunk async for chunk in model.stream([])]
+
+        assert len(chunks) == 4
+
+    def test_end_to_end_run(self):
+        """Test a small load run against the app served from another process."""
+        result = subprocess.run(
+            [
+                sys.executable, "-m", "src.load_test",
+                "--clients", "5", "--cycles", "3", "--fork-every", "2",
+                "--ramp-up", "0", "--response-tokens", "5",
+                "--tokens-per-second", "500", "--first-token-delay", "0",
+                "--json",
+            ],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout)
+        assert report["turns"] == 15
+        assert report["errors"] == 0
+        assert report["stream_end_ms"]["count"] == 15
+        assert report["inter_chunk_gap_ms"]["count"] == 15 * 4
+        assert report["db_write_ms"]["count"] == 30
+        assert report["event_loop_lag_ms"]["count"] > 0
+
+    @pytest.mark.asyncio
+    async def test_server_runs_in_its_own_process(self, tmp_path):
+        """Test that the app is not served from the test process."""
+        config = LoadTestConfig(
+            clients=2, cycles=1, ramp_up=0, response_tokens=2, first_token_delay=0
+        )
+
+        report = await run_load_test(config, str(tmp_path / "load.sqlite"))
+
+        assert report["turns"] == 2
+        # The database is configured in the server process only
+        assert os.environ.get("DATABASE_URL") != f"sqlite:///{tmp_path}/load.sqlite"
+        assert report["db_write_ms"]["count"] == 4
+
+    def test_gate_failure_sets_exit_status(self):
+        """Test that an unmet latency gate fails the run."""
+        result = subprocess.run(
+            [
+                sys.executable, "-m", "src.load_test",
+                "--clients", "1", "--cycles", "1", "--response-tokens", "2",
+                "--first-token-delay", "0.05", "--max-ttfc-p99-ms", "1",
+                "--json",
+            ],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+
+        assert result.returncode == 1
+        assert json.loads(result.stdout)["failed_gates"]
@@ -0,0 +1,266 @@
+"""
+Tests for the SQLite maintenance service.
+"""
+import fcntl
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from src.models import Conversation
+from src.repositories.conversation_repository import ConversationRepository
+from src.services.archive_service import ArchiveService
+from src.services.maintenance_service import ActivityMiddleware, MaintenanceService
+from src.services.write_scheduler import WriteScheduler, create_writer_engine
+
+
+def _create_free_pages(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE blobs (id INTEGER PRIMARY KEY, body TEXT)"))
+        for index in range(200):
+            conn.execute(
+                text("INSERT INTO blobs (body) VALUES (:body)"),
+                {"body": "x" * 4000},
+            )
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM blobs"))
+
+
+class TestMaintenanceService:
+    """Test cases for MaintenanceService."""
+
+    @pytest.mark.asyncio
+    async def test_run_once_reclaims_free_pages(self, file_engine):
+        """Test that a run vacuums, optimizes and checkpoints."""
+        _create_free_pages(file_engine)
+        service = MaintenanceService(file_engine, time_budget=5.0)
+
+        stats = await service.run_once()
+
+        assert stats.freelist_pages_before > 0
+        assert stats.freelist_pages_after == 0
+        assert stats.optimized
+        assert stats.wal_pages_checkpointed == stats.wal_pages
+        assert stats.skipped == []
+        assert service.last_stats is stats
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_skips_steps(self, file_engine):
+        """Test that steps past the time budget are skipped."""
+        _create_free_pages(file_engine)
+        service = MaintenanceService(file_engine, time_budget=0)
+
+        stats = await service.run_once()
+
+        assert stats.freelist_pages_after == stats.freelist_pages_before
+        assert stats.skipped == ["optimize", "wal_checkpoint", "reconcile_stats"]
+
+    @pytest.mark.asyncio
+    async def test_run_once_reconciles_conversation_stats(self, file_engine):
+        """Test that a run repairs stats and waits for the next interval."""
+        with file_engine.begin() as conn:
+            conn.execute(
+                Conversation.__table__.insert().values(title="Drifted", message_count=5)
+            )
+        service = MaintenanceService(file_engine, time_budget=5.0)
+
+        assert (await service.run_once()).conversations_reconciled == 1
+        assert (await service.run_once()).conversations_reconciled is None
+        with file_engine.connect() as conn:
+            count = conn.execute(text("SELECT message_count FROM conversations"))
+            assert count.scalar() == 0
+
+    @pytest.mark.asyncio
+    async def test_reconcile_writes_through_write_scheduler(
+        self, file_engine, database_url
+    ):
+        """Test that reconciliation batches are committed by the write scheduler."""
+        with file_engine.begin() as conn:
+            conn.execute(
+                Conversation.__table__.insert().values(title="Drifted", message_count=5)
+            )
+        scheduler = WriteScheduler(create_writer_engine(database_url))
+        await scheduler.start()
+        try:
+            service = MaintenanceService(
+                file_engine, time_budget=5.0, write_scheduler=scheduler
+            )
+            stats = await service.run_once()
+        finally:
+            await scheduler.stop()
+            scheduler.engine.dispose()
+
+        assert stats.conversations_reconciled == 1
+        assert scheduler.writes_committed == 1
+        with file_engine.connect() as conn:
+            count = conn.execute(text("SELECT message_count FROM conversations"))
+            assert count.scalar() == 0
+
+    @pytest.mark.asyncio
+    async def test_reconcile_resumes_after_time_budget(
+        self, file_engine, monkeypatch
+    ):
+        """Test that reconciliation stops between batches and resumes later."""
+        with file_engine.begin() as conn:
+            for title in ("First", "Second", "Third"):
+                conn.execute(
+                    Conversation.__table__.insert().values(title=title, message_count=5)
+                )
+        reconcile_stats = ConversationRepository.reconcile_stats
+
+        def slow_reconcile_stats(self, start_id=None, end_id=None):
+            time.sleep(0.6)
+            return reconcile_stats(self, start_id, end_id)
+
+        monkeypatch.setattr(
+            ConversationRepository, "reconcile_stats", slow_reconcile_stats
+        )
+        service = MaintenanceService(
+            file_engine, time_budget=0.5, reconcile_batch_size=2
+        )
+
+        first = await service.run_once()
+        second = await service.run_once()
+        third = await service.run_once()
+
+        # IDs start at 1, so the first batch covers only conversation 1
+        assert first.conversations_reconciled == 1
+        assert "reconcile_stats" in first.skipped
+        assert second.conversations_reconciled == 2
+        assert "reconcile_stats" not in second.skipped
+        assert third.conversations_reconciled is None
+
+    @pytest.mark.asyncio
+    async def test_run_once_archives_cold_conversations(
+        self, file_engine, tmp_path
+    ):
+        """Test that a run archives a bounded batch of cold conversations."""
+        cold = datetime.now(timezone.utc) - timedelta(days=200)
+        with file_engine.begin() as conn:
+            for title in ("First", "Second", "Third"):
+                conn.execute(
+                    Conversation.__table__.insert().values(title=title, updated_at=cold)
+                )
+        archive_service = ArchiveService(file_engine, str(tmp_path / "archive"))
+        service = MaintenanceService(
+            file_engine,
+            time_budget=5.0,
+            archive_service=archive_service,
+            archive_batch_size=2,
+        )
+
+        assert (await service.run_once()).conversations_archived == 2
+        assert (await service.run_once()).conversations_archived == 1
+
+    @pytest.mark.asyncio
+    async def test_archive_stops_at_time_budget(
+        self, file_engine, tmp_path, monkeypatch
+    ):
+        """Test that each conversation is archived alone within the budget."""
+        cold = datetime.now(timezone.utc) - timedelta(days=200)
+        with file_engine.begin() as conn:
+            for title in ("First", "Second", "Third"):
+                conn.execute(
+                    Conversation.__table__.insert().values(title=title, updated_at=cold)
+                )
+        archive_service = ArchiveService(file_engine, str(tmp_path / "archive"))
+        archived = []
+        archive = archive_service.archive
+
+        def slow_archive(conversation_ids, shard_name):
+            archived.append(conversation_ids)
+            archive(conversation_ids, shard_name)
+            time.sleep(0.6)
+
+        monkeypatch.setattr(archive_service, "archive", slow_archive)
+        service = MaintenanceService(
+            file_engine, time_budget=0.5, archive_service=archive_service
+        )
+
+        first = await service.run_once()
+        second = await service.run_once()
+
+        assert first.conversations_archived == 1
+        assert "archive" in first.skipped
+        assert second.conversations_archived == 1
+        assert archived == [[1], [2]]
+
+    def test_idle_tracking(self, file_engine):
+        """Test that in-flight requests and recent activity block maintenance."""
+        service = MaintenanceService(file_engine, idle_seconds=0)
+        assert service.is_idle()
+
+        service.request_started()
+        assert not service.is_idle()
+
+        service.request_finished()
+        assert service.is_idle()
+        assert not MaintenanceService(file_engine, idle_seconds=60).is_idle()
+
+    def test_activity_is_shared_between_workers(self, file_engine):
+        """Test that activity in one worker keeps the others from running."""
+        first = MaintenanceService(file_engine, idle_seconds=0.2)
+        second = MaintenanceService(file_engine, idle_seconds=0.2)
+        time.sleep(0.3)
+        assert second.is_idle()
+
+        first.touch()
+
+        assert not second.is_idle()
+
+    @pytest.mark.asyncio
+    async def test_only_one_worker_runs(self, file_engine):
+        """Test that a run is skipped while another worker holds the lock."""
+        service = MaintenanceService(file_engine, time_budget=5.0)
+
+        with open(service.state_path, "a") as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                stats = await service.run_once()
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+        assert stats.skipped == ["locked"]
+        assert not stats.optimized
+        assert (await service.run_once()).optimized
+
+    def test_websocket_messages_count_as_activity(self, file_engine):
+        """Test that WebSocket traffic, which HTTP middleware misses, is tracked."""
+        service = MaintenanceService(file_engine, idle_seconds=0.2)
+        app = FastAPI()
+        app.add_middleware(ActivityMiddleware, get_service=lambda: service)
+
+        @app.websocket("/ws")
+        async def echo(websocket: WebSocket):
+            await websocket.accept()
+            await websocket.send_text(await websocket.receive_text())
+            await websocket.close()
+
+        time.sleep(0.3)
+        assert service.is_idle()
+        with TestClient(app).websocket_connect("/ws") as ws:
+            ws.send_text("ping")
+            assert ws.receive_text() == "ping"
+
+        assert not service.is_idle()
+
+    @pytest.mark.asyncio
+    async def test_admin_endpoint_reports_last_run(self, file_engine):
+        """Test that the admin endpoint exposes the last run's statistics."""
+        import main
+
+        client = TestClient(main.app)
+        original = main.maintenance_service
+        main.maintenance_service = MaintenanceService(file_engine)
+        try:
+            assert client.get("/api/admin/maintenance").status_code == 404
+            await main.maintenance_service.run_once()
+            response = client.get("/api/admin/maintenance")
+        finally:
+            main.maintenance_service = original
+
+        assert response.status_code == 200
+        assert response.json()["optimized"] is True
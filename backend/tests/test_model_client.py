@@ -0,0 +1,167 @@
+"""
+Tests for the shared model client.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from src.services.model_client import ModelClient, Priority, TokenBucket
+
+
+def _mock_client(handler, **kwargs):
+    """
+    Create a client that talks to an in-process mock server.
+    """
+    kwargs.setdefault("default_rate_limit", (1000.0, 1000))
+    return ModelClient(
+        base_url="http://mock-model",
+        api_key="test-key",
+        transport=httpx.MockTransport(handler),
+        backoff_base=0.001,
+        **kwargs,
+    )
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket."""
+
+    @pytest.mark.asyncio
+    async def test_interactive_served_before_background(self):
+        """Test that a waiting interactive request jumps queued background ones."""
+        bucket = TokenBucket(rate=50.0, capacity=1)
+        await bucket.acquire()
+        served = []
+
+        async def acquire(name, priority):
+            await bucket.acquire(priority)
+            served.append(name)
+
+        background = [
+            asyncio.create_task(acquire(f"background-{i}", Priority.BACKGROUND))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(acquire("interactive", Priority.INTERACTIVE))
+        await asyncio.gather(interactive, *background)
+
+        assert served[0] == "interactive"
+
+    @pytest.mark.asyncio
+    async def test_rate_limits_bursts(self):
+        """Test that requests beyond the burst wait for refills."""
+        bucket = TokenBucket(rate=100.0, capacity=2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        for _ in range(6):
+            await bucket.acquire()
+
+        assert loop.time() - started >= 0.035
+
+
+class TestModelClient:
+    """Test cases for ModelClient."""
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self):
+        """Test that retryable statuses are retried until success."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"ok": True})
+
+        async with _mock_client(handler) as client:
+            response = await client.request("POST", "/v1/generate", json_body={})
+
+        assert response.json() == {"ok": True}
+        assert len(calls) == 3
+        assert calls[0].headers["x-goog-api-key"] == "test-key"
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """Test that the last error status is raised after retries run out."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(429)
+
+        async with _mock_client(handler, max_retries=2) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.request("POST", "/v1/generate", json_body={})
+
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_client_errors(self):
+        """Test that non-retryable statuses fail immediately."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400)
+
+        async with _mock_client(handler) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.request("POST", "/v1/generate", json_body={})
+
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_coalesces_identical_in_flight_requests(self):
+        """Test that identical concurrent requests share one upstream call."""
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"summary": "same"})
+
+        async with _mock_client(handler) as client:
+            responses = await asyncio.gather(
+                *(
+                    client.request(
+                        "POST", "/v1/summarize", json_body={"message_id": 1}
+                    )
+                    for _ in range(5)
+                ),
+                client.request("POST", "/v1/summarize", json_body={"message_id": 2}),
+            )
+
+        assert len(calls) == 2
+        assert all(r.json() == {"summary": "same"} for r in responses)
+
+    @pytest.mark.asyncio
+    async def test_interactive_does_not_join_background_call(self):
+        """Test that coalescing never queues interactive calls behind background."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.content)
+            return httpx.Response(200, json={})
+
+        async def summarize(priority):
+            await client.request(
+                "POST", "/v1/summarize", json_body={"id": 1}, priority=priority
+            )
+            finished.append(priority)
+
+        finished = []
+        async with _mock_client(handler, default_rate_limit=(20.0, 1)) as client:
+            # Drain the bucket so the following calls have to queue
+            await client.request("POST", "/v1/summarize", json_body={"id": 0})
+            background = asyncio.create_task(summarize(Priority.BACKGROUND))
+            await asyncio.sleep(0)
+            interactive = asyncio.create_task(summarize(Priority.INTERACTIVE))
+            await asyncio.sleep(0)
+            # A background caller may share the queued interactive call
+            joined = asyncio.create_task(summarize(Priority.BACKGROUND))
+            await asyncio.gather(background, interactive, joined)
+
+        assert len(calls) == 3
+        assert finished[0] == Priority.INTERACTIVE
+        assert finished.index(Priority.BACKGROUND) == 1
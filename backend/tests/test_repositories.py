@@ -166,4 +166,201 @@ class TestFileRepository:
         files = repo.get_by_message(sample_message.id)
         
         assert len(files) == 1
-        assert files[0].file_name == "test.pdf"
\ No newline at end of file
+        assert files[0].file_name == "test.pdf"
+
+class TestMessageTreeExpansion:
+    """Test cases for batched children lookup and subtree expansion."""
+    
+    def _create_tree(self, repo, conversation_id):
+        """
+        Create root -> (a -> (a1, a2 -> a2x), b).
+        """
+        def add(parent, content):
+            return repo.create({
+                "conversation_id": conversation_id,
+                "parent_message_id": parent.id if parent else None,
+                "role": "user",
+                "content": content
+            })
+        
+        root = add(None, "root")
+        a = add(root, "a")
+        b = add(root, "b")
+        a1 = add(a, "a1")
+        a2 = add(a, "a2")
+        a2x = add(a2, "a2x")
+        return root, a, b, a1, a2, a2x
+    
+    def test_get_children_many(self, test_db, sample_conversation):
+        """Test getting the children of several parents at once."""
+        repo = MessageRepository(test_db)
+        root, a, b, a1, a2, _ = self._create_tree(repo, sample_conversation.id)
+        
+        children = repo.get_children_many([root.id, a.id, b.id])
+        
+        assert [m.id for m in children[root.id]] == [a.id, b.id]
+        assert [m.id for m in children[a.id]] == [a1.id, a2.id]
+        assert children[b.id] == []
+    
+    def test_get_subtree_marks_frontier(self, test_db, sample_conversation):
+        """Test that the depth limit leaves counts and has-more markers."""
+        repo = MessageRepository(test_db)
+        root, a, b, a1, a2, _ = self._create_tree(repo, sample_conversation.id)
+        
+        tree = repo.get_subtree(root.id, depth=2)
+        
+        assert tree.child_count == 2
+        node_a, node_b = tree.children
+        assert [n.message.id for n in node_a.children] == [a1.id, a2.id]
+        assert node_b.children == [] and not node_b.has_more
+        node_a1, node_a2 = node_a.children
+        assert node_a1.child_count == 0 and not node_a1.has_more
+        assert node_a2.child_count == 1 and node_a2.has_more
+        assert node_a2.children == []
+    
+    def test_get_subtree_costs_one_query_per_level(self, test_db, sample_conversation):
+        """Test that expansion issues a constant number of queries per level."""
+        from sqlalchemy import event
+        
+        repo = MessageRepository(test_db)
+        root_id = self._create_tree(repo, sample_conversation.id)[0].id
+        statements = []
+        engine = test_db.get_bind()
+        
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            tree = repo.get_subtree(root_id, depth=1)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        
+        # Root lookup, one level of children, one frontier count
+        assert len(statements) == 3
+        assert tree.to_dict()["children"][0]["child_count"] == 2
+
+
+class TestConversationStats:
+    """Test cases for the denormalized conversation message stats."""
+    
+    def _add(self, repo, conversation_id, parent, content):
+        return repo.create({
+            "conversation_id": conversation_id,
+            "parent_message_id": parent.id if parent else None,
+            "role": "user",
+            "content": content
+        })
+    
+    def _stats(self, test_db, conversation_id):
+        conversation = test_db.get(Conversation, conversation_id)
+        test_db.refresh(conversation)
+        return (
+            conversation.message_count,
+            conversation.leaf_count,
+            conversation.last_message_preview,
+        )
+    
+    def test_stats_follow_inserts(self, test_db, sample_conversation):
+        """Test that inserts update counts, branch tips and the preview."""
+        conversation_id = sample_conversation.id
+        repo = MessageRepository(test_db)
+        
+        root = self._add(repo, conversation_id, None, "root")
+        assert self._stats(test_db, conversation_id) == (1, 1, "root")
+        
+        self._add(repo, conversation_id, root, "a")
+        assert self._stats(test_db, conversation_id) == (2, 1, "a")
+        
+        self._add(repo, conversation_id, root, "b" * 500)
+        count, leaves, preview = self._stats(test_db, conversation_id)
+        assert (count, leaves) == (3, 2)
+        assert preview == "b" * 120
+        
+        conversation = test_db.get(Conversation, conversation_id)
+        latest = repo.get_latest(conversation_id)
+        assert conversation.last_message_at == latest.created_at
+        assert conversation.updated_at == conversation.last_message_at
+    
+    def test_sibling_inserts_in_one_flush(self, test_db, sample_conversation):
+        """Test that siblings flushed together open one branch per sibling."""
+        conversation_id = sample_conversation.id
+        root = self._add(MessageRepository(test_db), conversation_id, None, "root")
+        
+        test_db.add_all([
+            Message(
+                conversation_id=conversation_id,
+                parent_message_id=root.id,
+                role="model",
+                content=content,
+            )
+            for content in ("a", "b")
+        ])
+        test_db.commit()
+        
+        count, leaves, _ = self._stats(test_db, conversation_id)
+        assert (count, leaves) == (3, 2)
+        assert ConversationRepository(test_db).reconcile_stats() == 0
+    
+    def test_stats_follow_deletes(self, test_db, sample_conversation):
+        """Test that deletes, including cascaded subtrees, update the stats."""
+        conversation_id = sample_conversation.id
+        repo = MessageRepository(test_db)
+        root = self._add(repo, conversation_id, None, "root")
+        a = self._add(repo, conversation_id, root, "a")
+        self._add(repo, conversation_id, a, "a1")
+        b = self._add(repo, conversation_id, root, "b")
+        assert self._stats(test_db, conversation_id) == (4, 2, "b")
+        
+        repo.delete(b.id)
+        assert self._stats(test_db, conversation_id) == (3, 1, "a1")
+        
+        repo.delete(a.id)
+        assert self._stats(test_db, conversation_id) == (1, 1, "root")
+        
+        repo.delete(root.id)
+        assert self._stats(test_db, conversation_id) == (0, 0, None)
+    
+    def test_recent_order_follows_new_messages(self, test_db):
+        """Test that adding a message moves its conversation to the top."""
+        conversation_repo = ConversationRepository(test_db)
+        older = conversation_repo.create({"title": "Older"})
+        newer = conversation_repo.create({"title": "Newer"})
+        
+        self._add(MessageRepository(test_db), older.id, None, "Hello")
+        
+        recent = conversation_repo.get_recent(limit=2)
+        assert [c.id for c in recent] == [older.id, newer.id]
+    
+    def test_reconcile_stats_repairs_drift(self, test_db, sample_conversation):
+        """Test that reconciliation corrects stats changed behind the ORM."""
+        conversation_id = sample_conversation.id
+        repo = MessageRepository(test_db)
+        root = self._add(repo, conversation_id, None, "root")
+        self._add(repo, conversation_id, root, "a")
+        self._add(repo, conversation_id, root, "b")
+        
+        # Bulk deletes skip the ORM events
+        test_db.query(Message).filter(Message.content == "b").delete()
+        test_db.commit()
+        assert self._stats(test_db, conversation_id) == (3, 2, "b")
+        
+        conversation_repo = ConversationRepository(test_db)
+        assert conversation_repo.reconcile_stats() == 1
+        assert self._stats(test_db, conversation_id) == (2, 1, "a")
+        assert conversation_repo.reconcile_stats() == 0
+    
+    def test_reconcile_stats_by_id_range(self, test_db):
+        """Test that reconciliation only touches the requested ID range."""
+        conversation_repo = ConversationRepository(test_db)
+        ids = [
+            conversation_repo.create({"title": title, "message_count": 3}).id
+            for title in ("First", "Second", "Third")
+        ]
+        assert conversation_repo.get_max_id() == ids[-1]
+        
+        assert conversation_repo.reconcile_stats(ids[1], ids[2]) == 1
+        counts = [conversation_repo.get(i).message_count for i in ids]
+        assert counts == [3, 0, 3]
+        assert conversation_repo.reconcile_stats(start_id=ids[1]) == 1
+        assert conversation_repo.reconcile_stats(end_id=ids[1]) == 1
@@ -0,0 +1,206 @@
+"""
+Tests for the startup fast path.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    create_engine,
+    event,
+    inspect,
+)
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from src.database import Base, configure_sqlite_connection
+from src.models import Conversation, Message
+from src.services.startup_service import StartupService, schema_fingerprint
+
+
+def _service(engine, **kwargs):
+    return StartupService(engine, sessionmaker(bind=engine), **kwargs)
+
+
+def _insert_old_rows(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO conversations (title, updated_at) "
+            "VALUES ('Old', '2024-01-01 00:00:00')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO messages (conversation_id, role, content, created_at) "
+            "VALUES (1, 'user', 'Hello there', '2024-01-01 00:00:00')"
+        )
+
+
+def _table_ddl(conn, name):
+    return conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).scalar()
+
+
+class TestStartupService:
+    """Test cases for StartupService."""
+
+    def test_schema_fingerprint_tracks_ddl(self, empty_file_engine):
+        """Test that the fingerprint is stable and changes with the schema."""
+        dialect = empty_file_engine.dialect
+        fingerprint = schema_fingerprint(Base.metadata, dialect)
+        assert fingerprint == schema_fingerprint(Base.metadata, dialect)
+        assert 0 < fingerprint < 2 ** 31
+
+        other = MetaData()
+        Table("extra", other, Column("id", Integer, primary_key=True))
+        assert schema_fingerprint(other, dialect) != fingerprint
+
+    def test_ensure_schema_skips_matching_version(self, empty_file_engine):
+        """Test that DDL only runs until the stored fingerprint matches."""
+        assert _service(empty_file_engine).ensure_schema()
+        assert "messages" in inspect(empty_file_engine).get_table_names()
+
+        second = _service(empty_file_engine)
+        assert not second.ensure_schema()
+        assert not second.report.schema_created
+
+    def test_ensure_schema_upgrades_old_tables(self, pre_series_engine):
+        """Test that tables created by an older version are upgraded."""
+        _insert_old_rows(pre_series_engine)
+
+        service = _service(pre_series_engine)
+        assert service.ensure_schema()
+
+        with pre_series_engine.connect() as conn:
+            assert "AUTOINCREMENT" in _table_ddl(conn, "messages")
+            stamped = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        inspector = inspect(pre_series_engine)
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            assert columns == set(table.columns.keys())
+        indexes = {index["name"] for index in inspector.get_indexes("messages")}
+        assert "ix_messages_conversation_created" in indexes
+        assert stamped == schema_fingerprint(Base.metadata, pre_series_engine.dialect)
+        assert service.warm_recent_conversations() == 1
+        assert not _service(pre_series_engine).ensure_schema()
+
+    def test_ensure_schema_rebuilds_tables_with_other_ddl(self, file_engine):
+        """Test that a table with every column but older DDL is rebuilt."""
+        ddl = str(CreateTable(Message.__table__).compile(dialect=file_engine.dialect))
+        with file_engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE messages")
+            conn.exec_driver_sql(ddl.replace(" AUTOINCREMENT", ""))
+            conn.exec_driver_sql("INSERT INTO conversations (title) VALUES ('Chat')")
+            for content in ("Hello", "Hi", "Bye"):
+                conn.exec_driver_sql(
+                    "INSERT INTO messages (conversation_id, role, content, "
+                    "token_count, path_token_count) VALUES (1, 'user', ?, 1, 1)",
+                    (content,),
+                )
+            # The newest row is gone, as after archiving or deleting it
+            conn.exec_driver_sql("DELETE FROM messages WHERE id = 3")
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('messages', 3)"
+            )
+
+        assert _service(file_engine).ensure_schema()
+
+        with file_engine.connect() as conn:
+            assert "AUTOINCREMENT" in _table_ddl(conn, "messages")
+            contents = conn.exec_driver_sql(
+                "SELECT content FROM messages ORDER BY id"
+            ).scalars().all()
+        assert contents == ["Hello", "Hi"]
+        db = sessionmaker(bind=file_engine)()
+        message = Message(conversation_id=1, role="user", content="New")
+        db.add(message)
+        db.commit()
+        assert message.id == 4
+        db.close()
+
+    def test_concurrent_workers_upgrade_once(self, pre_series_engine):
+        """Test that workers starting together do not upgrade twice."""
+        _insert_old_rows(pre_series_engine)
+        engines = [
+            create_engine(pre_series_engine.url, connect_args={"timeout": 30})
+            for _ in range(2)
+        ]
+        for engine in engines:
+            event.listen(engine, "connect", configure_sqlite_connection)
+        barrier = threading.Barrier(len(engines))
+
+        def start_worker(engine):
+            barrier.wait()
+            return _service(engine).ensure_schema()
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(engines)) as executor:
+                results = list(executor.map(start_worker, engines))
+        finally:
+            for engine in engines:
+                engine.dispose()
+
+        assert sorted(results) == [False, True]
+
+    def test_prewarm_pool_opens_connections(self, empty_file_engine):
+        """Test that the pool holds its connections before the first request."""
+        opened = _service(empty_file_engine).prewarm_pool()
+
+        assert opened == empty_file_engine.pool.size()
+        assert empty_file_engine.pool.checkedin() == opened
+
+    def test_warm_recent_conversations(self, empty_file_engine):
+        """Test that recent conversations are read and timed phases add up."""
+        service = _service(empty_file_engine, warm_conversations=2)
+        with service.phase("schema"):
+            service.ensure_schema()
+        db = sessionmaker(bind=empty_file_engine)()
+        for title in ("First", "Second", "Third"):
+            conversation = Conversation(title=title)
+            db.add(conversation)
+            db.flush()
+            root = Message(conversation_id=conversation.id, role="user", content="Hi")
+            db.add(root)
+            db.flush()
+            db.add(Message(
+                conversation_id=conversation.id,
+                parent_message_id=root.id,
+                role="model",
+                content="Hello",
+            ))
+        db.commit()
+        db.close()
+
+        with service.phase("cache_warmup"):
+            assert service.warm_recent_conversations() == 2
+        report = service.finish()
+
+        assert report.warmed_messages == 4
+        assert list(report.phases) == ["schema", "cache_warmup"]
+        assert report.total_ms == pytest.approx(sum(report.phases.values()))
+
+    def test_admin_endpoint_reports_phases(self, empty_file_engine):
+        """Test that the app exposes the startup breakdown after startup."""
+        import main
+
+        original = main.startup_service
+        main.startup_service = _service(empty_file_engine)
+        main.startup_service.record_phase("imports", 0.01)
+        try:
+            client = TestClient(main.app)
+            assert client.get("/api/admin/startup").status_code == 404
+            with client:
+                response = client.get("/api/admin/startup")
+        finally:
+            main.startup_service = original
+
+        assert response.status_code == 200
+        phases = response.json()["phases"]
+        for name in (
+            "imports", "schema", "connection_pool", "write_scheduler", "cache_warmup"
+        ):
+            assert name in phases
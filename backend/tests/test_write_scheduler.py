@@ -0,0 +1,151 @@
+"""
+Tests for the write scheduler.
+"""
+import asyncio
+import multiprocessing
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Conversation, Message
+from src.repositories.conversation_repository import ConversationRepository
+from src.repositories.message_repository import MessageRepository
+from src.services.write_scheduler import WriteScheduler, create_writer_engine
+
+
+def _count_messages(database_url):
+    engine = create_engine(database_url)
+    try:
+        with sessionmaker(bind=engine)() as session:
+            return session.query(Message).count()
+    finally:
+        engine.dispose()
+
+
+async def _write_messages(database_url, writers, messages_per_writer):
+    scheduler = WriteScheduler(create_writer_engine(database_url))
+    await scheduler.start()
+    try:
+        conversation_id = await scheduler.create(
+            ConversationRepository, {"title": "Stress"}
+        )
+        ids = await asyncio.gather(
+            *(
+                scheduler.create(
+                    MessageRepository,
+                    {
+                        "conversation_id": conversation_id,
+                        "role": "user",
+                        "content": f"writer {w} message {i}",
+                    },
+                )
+                for w in range(writers)
+                for i in range(messages_per_writer)
+            )
+        )
+    finally:
+        await scheduler.stop()
+        scheduler.engine.dispose()
+    return ids
+
+
+def _stress_worker(database_url, result_queue):
+    result_queue.put(asyncio.run(_write_messages(database_url, 10, 20)))
+
+
+class TestWriteScheduler:
+    """Test cases for WriteScheduler."""
+
+    @pytest.mark.asyncio
+    async def test_create_returns_assigned_ids(self, database_url):
+        """Test that callers receive the IDs of their created records."""
+        scheduler = WriteScheduler(create_writer_engine(database_url))
+        await scheduler.start()
+        try:
+            ids = await asyncio.gather(
+                *(
+                    scheduler.create(ConversationRepository, {"title": f"C{i}"})
+                    for i in range(20)
+                )
+            )
+        finally:
+            await scheduler.stop()
+            scheduler.engine.dispose()
+
+        assert len(set(ids)) == 20
+        assert scheduler.writes_committed == 20
+        assert scheduler.batches_committed < 20
+
+    @pytest.mark.asyncio
+    async def test_failed_write_does_not_abort_batch(self, database_url):
+        """Test that one failing write leaves the rest of its batch committed."""
+        scheduler = WriteScheduler(create_writer_engine(database_url))
+        await scheduler.start()
+        try:
+            results = await asyncio.gather(
+                scheduler.create(ConversationRepository, {"title": "Kept"}),
+                scheduler.create(ConversationRepository, {"title": None}),
+                scheduler.create(ConversationRepository, {"title": "Also kept"}),
+                return_exceptions=True,
+            )
+        finally:
+            await scheduler.stop()
+            scheduler.engine.dispose()
+
+        assert isinstance(results[0], int)
+        assert isinstance(results[1], Exception)
+        assert isinstance(results[2], int)
+        engine = create_engine(database_url)
+        with sessionmaker(bind=engine)() as session:
+            assert session.query(Conversation).count() == 2
+        engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_submit_requires_running_scheduler(self, database_url):
+        """Test that writes are rejected before the scheduler starts."""
+        scheduler = WriteScheduler(create_writer_engine(database_url))
+
+        with pytest.raises(RuntimeError):
+            await scheduler.submit(lambda session: None)
+
+    @pytest.mark.asyncio
+    async def test_writes_during_stop_are_rejected(self, database_url):
+        """Test that stopping commits queued writes and refuses new ones."""
+        scheduler = WriteScheduler(create_writer_engine(database_url))
+        await scheduler.start()
+        queued = asyncio.create_task(
+            scheduler.create(ConversationRepository, {"title": "Queued"})
+        )
+        await asyncio.sleep(0)
+        stopping = asyncio.create_task(scheduler.stop())
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(scheduler.submit(lambda session: None), 1)
+            await asyncio.wait_for(stopping, 5)
+        finally:
+            scheduler.engine.dispose()
+
+        assert isinstance(await queued, int)
+        assert not scheduler.running
+
+    def test_multi_process_writers(self, database_url):
+        """Test that concurrent worker processes all commit their writes."""
+        context = multiprocessing.get_context("spawn")
+        result_queue = context.Queue()
+        processes = [
+            context.Process(target=_stress_worker, args=(database_url, result_queue))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        ids = [result_queue.get(timeout=120) for _ in processes]
+        for process in processes:
+            process.join(timeout=30)
+            assert process.exitcode == 0
+
+        all_ids = [message_id for worker_ids in ids for message_id in worker_ids]
+        assert len(all_ids) == 4 * 200
+        assert len(set(all_ids)) == len(all_ids)
+        assert _count_messages(database_url) == len(all_ids)